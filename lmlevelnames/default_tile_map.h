@@ -1,15 +1,26 @@
 // Auto-generated from update_c_tilemap.py
-// Generated: 2025-10-30 04:14:02Z
+// Generated: 2026-10-16 07:40:39Z
 // Forward: TILE_TO_ASCII[0x00..0xFF] -> ASCII byte (0 if unmapped)
 // Reverse: ASCII_TO_TILE[0x00..0xFF] -> preferred tile code (0xFF if unmapped)
 // Note: Multiple tile codes may map to the same ASCII; reverse table picks the first.
+// Both tables are halves of one 64-byte aligned 512-byte array: TILE_MAP[tile] is the
+// forward lookup and TILE_MAP[256 + ascii] the reverse, with no branching in callers.
 
 #ifndef DEFAULT_TILE_MAP_H
 #define DEFAULT_TILE_MAP_H
 
 #include <stdint.h>
 
-static const uint8_t TILE_TO_ASCII[256] = {
+#if defined(_MSC_VER)
+#define TILE_MAP_ALIGN __declspec(align(64))
+#elif defined(__GNUC__)
+#define TILE_MAP_ALIGN __attribute__((aligned(64)))
+#else
+#define TILE_MAP_ALIGN
+#endif
+
+static TILE_MAP_ALIGN const uint8_t TILE_MAP[512] = {
+    /* TILE_TO_ASCII: TILE_MAP[0x000..0x0FF] */
     /* 0x00-0x0F */ 'A','B','C','D','E','F','G','H','I','J','K','L','M','N','O','P',
     /* 0x10-0x1F */ 'Q','R','S','T','U','V','W','X','Y','Z','!','.','-',',','?',' ',
     /* 0x20-0x2F */ 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
@@ -26,9 +37,7 @@ static const uint8_t TILE_TO_ASCII[256] = {
     /* 0xD0-0xDF */ 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
     /* 0xE0-0xEF */ 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
     /* 0xF0-0xFF */ 0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,
-};
-
-static const uint8_t ASCII_TO_TILE[256] = {
+    /* ASCII_TO_TILE: TILE_MAP[0x100..0x1FF] */
     /* 0x00-0x0F */ 0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,
     /* 0x10-0x1F */ 0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,
     /* 0x20-0x2F */ 0x1F,0x1A,0xFF,0x5A,0xFF,0xFF,0xFF,0x5D,0x5B,0x5C,0xFF,0xFF,0x1D,0x1C,0x1B,0xFF,
@@ -47,6 +56,9 @@ static const uint8_t ASCII_TO_TILE[256] = {
     /* 0xF0-0xFF */ 0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,0xFF,
 };
 
+#define TILE_TO_ASCII (TILE_MAP)
+#define ASCII_TO_TILE (TILE_MAP + 256)
+
 static inline uint8_t tile_to_ascii_byte(uint8_t tileCode) {
     return TILE_TO_ASCII[tileCode];
 }
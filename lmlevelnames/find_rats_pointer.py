@@ -12,10 +12,15 @@ data_ptr = struct.pack('<I', data_start_snes)[:3]
 print(f"Searching for bytes: {' '.join(f'{b:02X}' for b in data_ptr)}")
 print()
 
+# bytes.find scans in C (memchr for the first byte); restart one past each
+# hit so overlapping matches are still found. The search stops one byte
+# short of the end, matching the original range(len(rom) - 3) scan.
 matches = []
-for i in range(len(rom) - 3):
-    if rom[i:i+3] == data_ptr:
-        matches.append(i)
+end = len(rom) - 1
+i = rom.find(data_ptr, 0, end)
+while i >= 0:
+    matches.append(i)
+    i = rom.find(data_ptr, i + 1, end)
 
 print(f"Found {len(matches)} pointer(s)")
 print()
@@ -14,6 +14,7 @@ Enhanced features:
 """
 
 import argparse
+import json
 import hashlib
 import os
 import re
@@ -22,7 +23,14 @@ import shutil
 import re
 import struct
 import sys
-from typing import Dict, List, Optional, Tuple, Set
+from typing import Dict, List, Optional, Tuple, Set, TextIO, Union
+
+# Use orjson for JSON output when it is installed
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 levelset = []
 def normalize_lid(val):
@@ -112,8 +120,62 @@ DEFAULT_TILE_MAP = {
 }
 
 # Add graphic tiles 0x80-0xFF (all display as escape codes)
-for i in range(0x80, 0x100):
-    DEFAULT_TILE_MAP[i] = f'\\{i:02X}'
+DEFAULT_TILE_MAP.update({i: sys.intern(f'\\{i:02X}') for i in range(0x80, 0x100)})
+
+# Tile codes that carry no name content (blank, space, unused)
+_PAD_BYTES = bytes((0x00, 0x1F, 0xFF))
+
+
+def tile_map_to_list(tile_map: Dict[int, str]) -> List[Optional[str]]:
+    """
+    Convert a tile map dictionary to a 256-entry list indexed by tile code.
+    Unmapped tile codes are None; mapped strings are interned.
+    """
+    tile_list = [None] * 256
+    for tile_code, char in tile_map.items():
+        if 0 <= tile_code < 256:
+            tile_list[tile_code] = sys.intern(char)
+    return tile_list
+
+
+def build_decode_table(tile_map: Union[Dict[int, str], List[Optional[str]]],
+                       show_graphics: bool = False) -> Dict[int, Optional[str]]:
+    """
+    Build a str.translate() table that decodes a latin-1 view of tile data.
+    
+    Every tile code maps to its output text, or to None when it should be
+    dropped (padding bytes, and graphic codes unless show_graphics is set).
+    """
+    if isinstance(tile_map, dict):
+        tile_map = tile_map_to_list(tile_map)
+    
+    table = {}
+    for byte, char in enumerate(tile_map):
+        if char is None:
+            table[byte] = None if byte == 0x00 or byte == 0xFF else f'[?{byte:02X}]'
+        elif show_graphics or not char.startswith('\\'):
+            table[byte] = char
+        else:
+            table[byte] = None
+    return table
+
+
+_DEFAULT_TILE_LIST = tile_map_to_list(DEFAULT_TILE_MAP)
+_DEFAULT_DECODE_TABLES = {
+    False: build_decode_table(_DEFAULT_TILE_LIST, False),
+    True: build_decode_table(_DEFAULT_TILE_LIST, True),
+}
+
+# Deletes vowels so consonant counts come from len() instead of a Python loop
+_STRIP_VOWELS = str.maketrans('', '', 'aeiou')
+
+
+def _get_decode_table(tile_map: Union[Dict[int, str], List[Optional[str]]],
+                      show_graphics: bool) -> Dict[int, Optional[str]]:
+    """Return the decode table for tile_map, reusing the prebuilt default tables."""
+    if tile_map is DEFAULT_TILE_MAP or tile_map is _DEFAULT_TILE_LIST:
+        return _DEFAULT_DECODE_TABLES[bool(show_graphics)]
+    return build_decode_table(tile_map, show_graphics)
 
 
 def snes_to_rom_offset(snes_addr: int, header_offset: int = 0) -> int:
@@ -186,31 +248,22 @@ def get_level_name_pointers(rom_data: bytes, header_offset: int) -> Tuple[Option
     return block_0_rom, block_1_rom
 
 
-def decode_level_name(tile_data: bytes, tile_map: Dict[int, str], show_graphics: bool = False) -> str:
+def decode_level_name(tile_data: bytes, tile_map: Union[Dict[int, str], List[Optional[str]]],
+                      show_graphics: bool = False) -> str:
     """
     Decode a level name from tile data.
     
     Args:
         tile_data: 19 bytes of tile data
-        tile_map: Dictionary mapping tile codes to characters
+        tile_map: Dictionary mapping tile codes to characters, or the
+                  equivalent 256-entry list from tile_map_to_list()
         show_graphics: If True, show graphic codes; if False, hide them
     
     Returns:
         Decoded string
     """
-    decoded = []
-    for byte in tile_data:
-        if byte in tile_map:
-            char = tile_map[byte]
-            if show_graphics or not char.startswith('\\'):
-                decoded.append(char)
-        elif byte == 0x00 or byte == 0xFF:
-            # Skip padding bytes
-            continue
-        else:
-            decoded.append(f'[?{byte:02X}]')
-    
-    return ''.join(decoded).strip()
+    table = _get_decode_table(tile_map, show_graphics)
+    return tile_data.decode('latin-1').translate(table).strip()
 
 
 def extract_level_names(
@@ -240,84 +293,135 @@ def extract_level_names(
     if block_0_rom is None:
         return {}
     
+    # Build the decode table once; each name is then decoded by str.translate
+    decode_table = _get_decode_table(tile_map, show_graphics)
+    
     level_names = {}
     
     # Determine range
     min_level = level_range[0] if level_range else 0
     max_level = level_range[1] if level_range else 0x1FF
     
-    for level_id in range(min_level, max_level + 1):
-        # Determine which block to use
-        if level_id < 0x100:
-            block_offset = block_0_rom
-            offset_in_block = level_id * LEVEL_NAME_SIZE
-        else:
-            if block_1_rom is None:
-                continue
-            block_offset = block_1_rom
-            offset_in_block = (level_id - 0x100) * LEVEL_NAME_SIZE
-        
-        level_offset = block_offset + offset_in_block
-        
-        if level_offset + LEVEL_NAME_SIZE > len(rom_data):
-            continue
-        
-        level_data = rom_data[level_offset:level_offset + LEVEL_NAME_SIZE]
-        
-        # Check if level has a name (not all padding)
-        has_name = any(b != 0 and b != 0x1F and b != 0xFF for b in level_data)
+    # Block 0 holds levels 0x000-0x0FF, block 1 holds 0x100 and up. Clip each
+    # block's ID range once so every name read is known to lie inside the ROM.
+    blocks = [(0x000, 0x0FF, block_0_rom)]
+    if block_1_rom is not None:
+        blocks.append((0x100, max_level, block_1_rom))
+    
+    for first_id, last_id, block_rom in blocks:
+        first_level = max(min_level, first_id)
+        last_level = min(max_level, last_id,
+                         first_id + (len(rom_data) - block_rom) // LEVEL_NAME_SIZE - 1)
         
-        if not has_name:
+        # Read the block's names as one slab and skip it if it is all padding
+        block_start = block_rom + (first_level - first_id) * LEVEL_NAME_SIZE
+        block_data = rom_data[block_start:block_rom + (last_level - first_id + 1) * LEVEL_NAME_SIZE]
+        if not block_data.translate(None, _PAD_BYTES):
             continue
         
-        decoded = decode_level_name(level_data, tile_map, show_graphics)
-        
-        if decoded:  # Only include if there's actual decoded text
-            level_names[level_id] = {
-                'level_id': level_id,
-                'name': decoded,
-                'rom_offset': level_offset,
-                'raw_data': level_data
-            }
+        for level_id in range(first_level, last_level + 1):
+            name_start = (level_id - first_level) * LEVEL_NAME_SIZE
+            level_data = block_data[name_start:name_start + LEVEL_NAME_SIZE]
+            level_offset = block_start + name_start
+            
+            # Check if level has a name (not all padding)
+            if not level_data.translate(None, _PAD_BYTES):
+                continue
+            
+            decoded = level_data.decode('latin-1').translate(decode_table).strip()
+            
+            if decoded:  # Only include if there's actual decoded text
+                level_names[level_id] = {
+                    'level_id': level_id,
+                    'name': decoded,
+                    'rom_offset': level_offset,
+                    'raw_data': level_data
+                }
     
     return level_names
 
 
+# One "XX = char" tile map line; comment and malformed lines do not match
+_TILEMAP_LINE = re.compile(r'^\s*(?:0[xX])?([0-9A-Fa-f]+)\s*=\s*(.*?)\s*$')
+_TILEMAP_ESCAPES = {'\\n': '\n', '\\t': '\t'}
+
+
 def load_custom_tile_map(filepath: str) -> Dict[int, str]:
     """Load a custom tile mapping from a file."""
-    tile_map = {}
-    
     with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            
-            parts = line.split('=', 1)
-            if len(parts) != 2:
-                continue
-            
-            tile_code_str, char = parts
-            tile_code_str = tile_code_str.strip()
-            char = char.strip()
-            
-            # Parse tile code (hex)
-            if tile_code_str.startswith('0x') or tile_code_str.startswith('0X'):
-                tile_code = int(tile_code_str, 16)
-            else:
-                tile_code = int(tile_code_str, 16)
-            
-            # Handle escape sequences in character
-            if char.startswith('\\'):
-                if char == '\\n':
-                    char = '\n'
-                elif char == '\\t':
-                    char = '\t'
-                # Otherwise keep as-is
-            
-            tile_map[tile_code] = char
+        return {
+            int(m.group(1), 16): sys.intern(_TILEMAP_ESCAPES.get(m.group(2), m.group(2)))
+            for m in map(_TILEMAP_LINE.match, f) if m
+        }
+
+
+# On-disk cache of level names extracted from vanilla ROMs
+VANILLA_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'rhplay'
+)
+
+
+def _vanilla_names_cache_path(vanilla_rom_data: bytes,
+                              tile_map: Union[Dict[int, str], List[Optional[str]]]) -> str:
+    """Cache file path for names extracted from this ROM with this tile map."""
+    if isinstance(tile_map, dict):
+        tile_map = tile_map_to_list(tile_map)
+    rom_sha = hashlib.sha256(vanilla_rom_data).hexdigest()
+    map_sha = hashlib.sha256(repr(tile_map).encode('utf-8')).hexdigest()
+    return os.path.join(VANILLA_CACHE_DIR, f'vanilla_{rom_sha[:16]}_{map_sha[:16]}.json')
+
+
+def _load_cached_vanilla_names(cache_path: str) -> Optional[Dict[int, str]]:
+    """Load cached vanilla names, or None if there is no usable cache entry."""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        return {int(level_id): name for level_id, name in cached.items()}
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _save_cached_vanilla_names(cache_path: str, names: Dict[int, str]) -> None:
+    """Save vanilla names to the cache. Failures are ignored."""
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({str(level_id): name for level_id, name in names.items()}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def extract_vanilla_level_names(vanilla_rom_data: bytes,
+                                tile_map: Dict[int, str]) -> Optional[Dict[int, str]]:
+    """
+    Extract level_id -> name from vanilla ROM data, using the on-disk cache.
+    
+    Returns None if the ROM does not have the Level Names Patch installed.
+    """
+    has_header, header_offset = detect_header(vanilla_rom_data)
+    
+    if not check_level_names_patch(vanilla_rom_data, header_offset):
+        return None
     
-    return tile_map
+    # Names only depend on the ROM contents and the tile map, so reuse the
+    # result of an earlier run when both match
+    cache_path = _vanilla_names_cache_path(vanilla_rom_data, tile_map)
+    cached_names = _load_cached_vanilla_names(cache_path)
+    if cached_names is not None:
+        return cached_names
+    
+    vanilla_names = extract_level_names(vanilla_rom_data, header_offset, tile_map, False, None)
+    
+    # Convert to simple dict of id -> name
+    names = {level_id: info['name'] for level_id, info in vanilla_names.items()}
+    _save_cached_vanilla_names(cache_path, names)
+    return names
 
 
 def load_vanilla_level_names(vanilla_rom_path: Optional[str], tile_map: Dict[int, str]) -> Dict[int, str]:
@@ -343,15 +447,10 @@ def load_vanilla_level_names(vanilla_rom_path: Optional[str], tile_map: Dict[int
         # Fall back to hardcoded
         return VANILLA_LEVEL_NAMES.copy()
     
-    has_header, header_offset = detect_header(vanilla_rom_data)
-    
-    if not check_level_names_patch(vanilla_rom_data, header_offset):
+    names = extract_vanilla_level_names(vanilla_rom_data, tile_map)
+    if names is None:
         return VANILLA_LEVEL_NAMES.copy()
-    
-    vanilla_names = extract_level_names(vanilla_rom_data, header_offset, tile_map, False, None)
-    
-    # Convert to simple dict of id -> name
-    return {level_id: info['name'] for level_id, info in vanilla_names.items()}
+    return names
 
 
 def is_likely_message_box_text(text: str, level_id: int) -> bool:
@@ -508,8 +607,8 @@ def has_english_words(text: str) -> bool:
     # Alternative: Check if words look like English (have vowels and consonants)
     for word in words:
         if len(word) >= 4:
-            vowels = sum(1 for c in word if c in 'aeiou')
-            consonants = len(word) - vowels
+            consonants = len(word.translate(_STRIP_VOWELS))
+            vowels = len(word) - consonants
             # English words typically have both vowels and consonants
             if vowels >= 1 and consonants >= 2:
                 return True
@@ -658,6 +757,46 @@ def filter_level_names(
     return filtered
 
 
+def write_level_names(fp: TextIO, level_names: Dict[int, Dict], output_format: str) -> None:
+    """
+    Write level names to an open text stream in the given format.
+    
+    Lines are written as they are formatted rather than collected and
+    joined first, so the full output never has to sit in memory twice.
+    
+    Args:
+        fp: Output stream
+        level_names: Dictionary of level names keyed by level ID
+        output_format: 'text', 'csv' or 'json'
+    """
+    if output_format == 'text':
+        for level_id in sorted(level_names.keys()):
+            info = level_names[level_id]
+            fp.write(f"Level 0x{level_id:03X}: {info['name']}\n")
+    
+    elif output_format == 'csv':
+        fp.write("LevelID,Name,ROMOffset,HexData\n")
+        for level_id in sorted(level_names.keys()):
+            info = level_names[level_id]
+            name = info['name'].replace('"', '""')  # Escape quotes
+            hex_data = info['raw_data'].hex()
+            fp.write(f'0x{level_id:03X},"{name}",0x{info["rom_offset"]:06X},{hex_data}\n')
+    
+    elif output_format == 'json':
+        output_dict = {}
+        for level_id, info in level_names.items():
+            output_dict[f"0x{level_id:03X}"] = {
+                'name': info['name'],
+                'rom_offset': f"0x{info['rom_offset']:06X}",
+                'hex_data': info['raw_data'].hex()
+            }
+        if ORJSON_AVAILABLE:
+            fp.write(orjson.dumps(output_dict, option=orjson.OPT_INDENT_2).decode('utf-8'))
+        else:
+            json.dump(output_dict, fp, indent=2, ensure_ascii=False)
+        fp.write('\n')
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Extract level names from Lunar Magic edited SMW ROM files',
@@ -721,8 +860,7 @@ Examples:
         orig_path = os.getcwd()
         os.chdir("temp")
         for f in glob.glob("*.mwl"):
-            if re.match("^.*\.mwl$", f):
-                os.remove(f)
+            os.remove(f)
         #
         #"Lunar Magic.exe" -ExpandROM "ROMFileName.smc" SizeOfROM
         #"Lunar Magic.exe" -ExportGFX "ROMFileName.smc"
@@ -753,12 +891,12 @@ Examples:
         os.system('timeout 4 wine ../lm361/lm361.exe -TransferOverworld temp_lm361.sfc temp_analyze.sfc')
         os.system('timeout 4 wine ../lm361/lm361.exe -ExportMultLevels temp_analyze.sfc MWL 1')
         os.system('wine ../lm361/lm361.exe -ImportMultLevels temp_lm361.sfc "./"')
-        for f in glob.glob("MWL*.mwl"):
-            result = re.match("^MWL ([^.]+)\.mwl$", f)
-            #if len(result.groups) > 0:
-            if result:
-                mgroup = result.groups(0)[0]
-                levelset.append(normalize_lid(mgroup))
+        for entry in os.scandir('.'):
+            name = entry.name
+            if name.startswith('MWL ') and name.endswith('.mwl'):
+                lid = name[4:-4]
+                if lid and '.' not in lid:
+                    levelset.append(normalize_lid(lid))
         os.chdir(orig_path)
         if (args.gametag):
             shutil.copy("temp/temp_lm361.sfc", "temp_lm361_" + str(args.gametag) + ".sfc")
@@ -881,48 +1019,18 @@ Examples:
     if args.verbose:
         print("", file=sys.stderr)
     
-    # Format output
-    output_lines = []
-    
-    if args.format == 'text':
-        for level_id in sorted(level_names.keys()):
-            info = level_names[level_id]
-            output_lines.append(f"Level 0x{level_id:03X}: {info['name']}")
-    
-    elif args.format == 'csv':
-        output_lines.append("LevelID,Name,ROMOffset,HexData")
-        for level_id in sorted(level_names.keys()):
-            info = level_names[level_id]
-            name = info['name'].replace('"', '""')  # Escape quotes
-            hex_data = info['raw_data'].hex()
-            output_lines.append(f'0x{level_id:03X},"{name}",0x{info["rom_offset"]:06X},{hex_data}')
-    
-    elif args.format == 'json':
-        import json
-        output_dict = {}
-        for level_id, info in level_names.items():
-            output_dict[f"0x{level_id:03X}"] = {
-                'name': info['name'],
-                'rom_offset': f"0x{info['rom_offset']:06X}",
-                'hex_data': info['raw_data'].hex()
-            }
-        output_lines.append(json.dumps(output_dict, indent=2, ensure_ascii=False))
-    
     # Write output
-    output_text = '\n'.join(output_lines)
-    
     if args.output:
         try:
-            with open(args.output, 'w', encoding='utf-8') as f:
-                f.write(output_text)
-                f.write('\n')
+            with open(args.output, 'w', encoding='utf-8', buffering=65536) as f:
+                write_level_names(f, level_names, args.format)
             if args.verbose:
                 print(f"Output written to {args.output}", file=sys.stderr)
         except IOError as e:
             print(f"Error writing output file: {e}", file=sys.stderr)
             return 1
     else:
-        print(output_text)
+        write_level_names(sys.stdout, level_names, args.format)
     
     return 0
 
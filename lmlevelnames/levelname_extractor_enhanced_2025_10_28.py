@@ -10,261 +10,21 @@ Enhanced with filtering options for edited/vanilla/word-based filtering.
 """
 
 import argparse
-import re
-import struct
 import sys
-from typing import Dict, List, Optional, Tuple, Set
-
-# Default Lunar Magic tile-to-character mapping
-DEFAULT_TILE_MAP = {
-    # Row 1: A-P (0x00-0x0F)
-    0x00: 'A', 0x01: 'B', 0x02: 'C', 0x03: 'D', 0x04: 'E', 0x05: 'F',
-    0x06: 'G', 0x07: 'H', 0x08: 'I', 0x09: 'J', 0x0A: 'K', 0x0B: 'L',
-    0x0C: 'M', 0x0D: 'N', 0x0E: 'O', 0x0F: 'P',
-    
-    # Row 2: Q-Z, punctuation (0x10-0x1F)
-    0x10: 'Q', 0x11: 'R', 0x12: 'S', 0x13: 'T', 0x14: 'U', 0x15: 'V',
-    0x16: 'W', 0x17: 'X', 0x18: 'Y', 0x19: 'Z', 0x1A: '!', 0x1B: '.',
-    0x1C: '-', 0x1D: ',', 0x1E: '?', 0x1F: ' ',
-    
-    # Row 3: Special characters (0x20-0x2F) - showing as escape codes
-    0x20: '\\20', 0x21: '\\21', 0x22: '\\22', 0x23: '\\23', 0x24: '\\24',
-    0x25: '\\25', 0x26: '\\26', 0x27: '\\27', 0x28: '\\28', 0x29: '\\29',
-    0x2A: '\\2A', 0x2B: '\\2B', 0x2C: '\\2C', 0x2D: '\\2D', 0x2E: '\\2E', 0x2F: '\\2F',
-    
-    # Row 4: Special characters (0x30-0x3F)
-    0x30: '\\30', 0x31: '\\31', 0x32: 'I', 0x33: 'L', 0x34: 'L', 0x35: 'U',
-    0x36: 'S', 0x37: 'I', 0x38: 'Y', 0x39: 'E', 0x3A: 'L', 0x3B: 'O',
-    0x3C: 'W', 0x3D: '?', 0x3E: '\\3E', 0x3F: '!',
-    
-    # Row 5: lowercase a-p (0x40-0x4F)
-    0x40: 'a', 0x41: 'b', 0x42: 'c', 0x43: 'd', 0x44: 'e', 0x45: 'f',
-    0x46: 'g', 0x47: 'h', 0x48: 'i', 0x49: 'j', 0x4A: 'k', 0x4B: 'l',
-    0x4C: 'm', 0x4D: 'n', 0x4E: 'o', 0x4F: 'p',
-    
-    # Row 6: lowercase q-z, special characters (0x50-0x5F)
-    0x50: 'q', 0x51: 'r', 0x52: 's', 0x53: 't', 0x54: 'u', 0x55: 'v',
-    0x56: 'w', 0x57: 'x', 0x58: 'y', 0x59: 'z', 0x5A: '#', 0x5B: '(',
-    0x5C: ')', 0x5D: "'", 0x5E: '\\5E', 0x5F: '\\5F',
-    
-    # Row 7: Numbers and special (0x60-0x6F)
-    0x60: '\\60', 0x61: '\\61', 0x62: '\\62', 0x63: '1', 0x64: '2',
-    0x65: '3', 0x66: '4', 0x67: '5', 0x68: '6', 0x69: '7', 0x6A: '8',
-    0x6B: '9', 0x6C: '0', 0x6D: '\\6D', 0x6E: '\\6E', 0x6F: '\\6F',
-    
-    # Row 8: Special graphics (0x70-0x7F)
-    0x70: '\\70', 0x71: '\\71', 0x72: '\\72', 0x73: '\\73', 0x74: '\\74',
-    0x75: '\\75', 0x76: '\\76', 0x77: '\\77', 0x78: '\\78', 0x79: '\\79',
-    0x7A: '\\7A', 0x7B: '\\7B', 0x7C: '\\7C', 0x7D: '\\7D', 0x7E: '\\7E', 0x7F: '\\7F',
-}
-
-# Add graphic tiles 0x80-0xFF (all display as escape codes)
-for i in range(0x80, 0x100):
-    DEFAULT_TILE_MAP[i] = f'\\{i:02X}'
-
-
-def snes_to_rom_offset(snes_addr: int, header_offset: int = 0) -> int:
-    """Convert SNES LoROM address to ROM file offset."""
-    bank = (snes_addr >> 16) & 0xFF
-    offset_in_bank = snes_addr & 0xFFFF
-    
-    if offset_in_bank < 0x8000:
-        rom_offset = (bank << 15) | offset_in_bank
-    else:
-        rom_offset = (bank << 15) | (offset_in_bank - 0x8000)
-    
-    return rom_offset + header_offset
-
-
-def detect_header(rom_data: bytes) -> Tuple[bool, int]:
-    """
-    Detect if ROM has a 512-byte header.
-    Returns: (has_header, header_offset)
-    """
-    rom_size = len(rom_data)
-    
-    # Standard SMW ROMs are multiples of 1024 bytes
-    # Headered ROMs are 512 bytes larger
-    if rom_size % 0x400 == 0x200:
-        return True, 512
-    else:
-        return False, 0
-
-
-def check_level_names_patch(rom_data: bytes, header_offset: int) -> bool:
-    """Check if Lunar Magic Level Names Patch is installed."""
-    snes_hijack = 0x048E81
-    rom_hijack = snes_to_rom_offset(snes_hijack, header_offset)
-    
-    if rom_hijack >= len(rom_data):
-        return False
-    
-    hijack_byte = rom_data[rom_hijack]
-    return hijack_byte == 0x22  # JSR instruction
-
-
-def get_level_name_pointers(rom_data: bytes, header_offset: int) -> Tuple[Optional[int], Optional[int]]:
-    """
-    Get pointers to level name data blocks.
-    Returns: (block_0_rom_offset, block_1_rom_offset)
-    """
-    # Block 0: Levels 0x000-0x0FF
-    snes_pointer_addr = 0x03BB57
-    rom_pointer_addr = snes_to_rom_offset(snes_pointer_addr, header_offset)
-    
-    if rom_pointer_addr + 3 > len(rom_data):
-        return None, None
-    
-    patch_pointer = (rom_data[rom_pointer_addr] |
-                     rom_data[rom_pointer_addr + 1] << 8 |
-                     rom_data[rom_pointer_addr + 2] << 16)
-    
-    block_0_rom = snes_to_rom_offset(patch_pointer, header_offset)
-    
-    # Block 1: Levels 0x100-0x1FF
-    # This is at a fixed relative offset from block 0
-    # Calculate based on the pattern we observed
-    block_1_rom = 0x08EF46  # Known offset for Akogare ROMs
-    
-    # Verify block 1 exists and has valid data
-    if block_1_rom + 19 > len(rom_data):
-        block_1_rom = None
-    
-    return block_0_rom, block_1_rom
-
-
-def decode_level_name(tile_data: bytes, tile_map: Dict[int, str], show_graphics: bool = False) -> str:
-    """
-    Decode a level name from tile data.
-    
-    Args:
-        tile_data: 19 bytes of tile data
-        tile_map: Dictionary mapping tile codes to characters
-        show_graphics: If True, show graphic codes; if False, hide them
-    
-    Returns:
-        Decoded string
-    """
-    decoded = []
-    for byte in tile_data:
-        if byte in tile_map:
-            char = tile_map[byte]
-            if show_graphics or not char.startswith('\\'):
-                decoded.append(char)
-        elif byte == 0x00 or byte == 0xFF:
-            # Skip padding bytes
-            continue
-        else:
-            decoded.append(f'[?{byte:02X}]')
-    
-    return ''.join(decoded).strip()
-
-
-def extract_level_names(
-    rom_data: bytes,
-    header_offset: int,
-    tile_map: Dict[int, str],
-    show_graphics: bool = False,
-    level_range: Optional[Tuple[int, int]] = None
-) -> Dict[int, Dict]:
-    """
-    Extract level names from ROM.
-    
-    Args:
-        rom_data: ROM file data
-        header_offset: Header offset (0 or 512)
-        tile_map: Tile-to-character mapping
-        show_graphics: Whether to show graphic tile codes
-        level_range: Optional (min, max) level ID range to extract
-    
-    Returns:
-        Dictionary of level names keyed by level ID
-    """
-    LEVEL_NAME_SIZE = 19
-    
-    block_0_rom, block_1_rom = get_level_name_pointers(rom_data, header_offset)
-    
-    if block_0_rom is None:
-        return {}
-    
-    level_names = {}
-    
-    # Determine range
-    min_level = level_range[0] if level_range else 0
-    max_level = level_range[1] if level_range else 0x1FF
-    
-    for level_id in range(min_level, max_level + 1):
-        # Determine which block to use
-        if level_id < 0x100:
-            block_offset = block_0_rom
-            offset_in_block = level_id * LEVEL_NAME_SIZE
-        else:
-            if block_1_rom is None:
-                continue
-            block_offset = block_1_rom
-            offset_in_block = (level_id - 0x100) * LEVEL_NAME_SIZE
-        
-        level_offset = block_offset + offset_in_block
-        
-        if level_offset + LEVEL_NAME_SIZE > len(rom_data):
-            continue
-        
-        level_data = rom_data[level_offset:level_offset + LEVEL_NAME_SIZE]
-        
-        # Check if level has a name (not all padding)
-        has_name = any(b != 0 and b != 0x1F and b != 0xFF for b in level_data)
-        
-        if not has_name:
-            continue
-        
-        decoded = decode_level_name(level_data, tile_map, show_graphics)
-        
-        if decoded:  # Only include if there's actual decoded text
-            level_names[level_id] = {
-                'level_id': level_id,
-                'name': decoded,
-                'rom_offset': level_offset,
-                'raw_data': level_data
-            }
-    
-    return level_names
-
-
-def load_custom_tile_map(filepath: str) -> Dict[int, str]:
-    """Load a custom tile mapping from a file."""
-    tile_map = {}
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            
-            parts = line.split('=', 1)
-            if len(parts) != 2:
-                continue
-            
-            tile_code_str, char = parts
-            tile_code_str = tile_code_str.strip()
-            char = char.strip()
-            
-            # Parse tile code (hex)
-            if tile_code_str.startswith('0x') or tile_code_str.startswith('0X'):
-                tile_code = int(tile_code_str, 16)
-            else:
-                tile_code = int(tile_code_str, 16)
-            
-            # Handle escape sequences in character
-            if char.startswith('\\'):
-                if char == '\\n':
-                    char = '\n'
-                elif char == '\\t':
-                    char = '\t'
-                # Otherwise keep as-is
-            
-            tile_map[tile_code] = char
-    
-    return tile_map
+from typing import Dict, Optional
+
+# Shared extraction code lives in levelname_extractor3; this script only
+# differs in how it loads vanilla names and filters results
+from levelname_extractor3 import (
+    DEFAULT_TILE_MAP,
+    detect_header,
+    check_level_names_patch,
+    extract_level_names,
+    extract_vanilla_level_names,
+    load_custom_tile_map,
+    has_english_words,
+    write_level_names,
+)
 
 
 def load_vanilla_level_names(vanilla_rom_path: str, tile_map: Dict[int, str]) -> Dict[int, str]:
@@ -279,60 +39,7 @@ def load_vanilla_level_names(vanilla_rom_path: str, tile_map: Dict[int, str]) ->
     except (FileNotFoundError, IOError):
         return {}
     
-    has_header, header_offset = detect_header(vanilla_rom_data)
-    
-    if not check_level_names_patch(vanilla_rom_data, header_offset):
-        return {}
-    
-    vanilla_names = extract_level_names(vanilla_rom_data, header_offset, tile_map, False, None)
-    
-    # Convert to simple dict of id -> name
-    return {level_id: info['name'] for level_id, info in vanilla_names.items()}
-
-
-def has_english_words(text: str) -> bool:
-    """
-    Check if text contains English words (not just random characters).
-    Uses a simple heuristic: looks for common English words or word patterns.
-    """
-    # Remove special characters and normalize
-    clean_text = re.sub(r'[^a-zA-Z\s]', ' ', text).lower()
-    words = clean_text.split()
-    
-    if not words:
-        return False
-    
-    # Common English words that appear in level names
-    common_words = {
-        'the', 'a', 'an', 'of', 'in', 'on', 'at', 'to', 'for', 'with', 'from',
-        'secret', 'area', 'castle', 'house', 'ghost', 'plains', 'island', 'mountain',
-        'bridge', 'lake', 'road', 'star', 'switch', 'palace', 'fortress', 'valley',
-        'forest', 'cave', 'cavern', 'hills', 'passage', 'gate', 'gateway', 'door',
-        'donut', 'vanilla', 'chocolate', 'butter', 'cheese', 'cookie', 'soda',
-        'sunken', 'ship', 'world', 'special', 'top', 'yellow', 'green', 'blue', 'red',
-        'keep', 'watcher', 'pickle', 'backtrack', 'moth', 'tubba', 'forgotten',
-        'gridiron', 'ridge', 'bullet', 'promenade', 'celestial', 'rex', 'cloon',
-        'shiverthorn', 'hollow', 'stormcrow', 'alcazar', 'toxic', 'underscore',
-        'burrow', 'twilight', 'fritzer', 'whynot', 'lookout', 'grim', 'shade',
-        'manor', 'abkhazia', 'living', 'earth', 'super', 'koopa', 'australian',
-        'airways', 'labrys', 'abyss',
-    }
-    
-    # Check if at least one word is in our common words list
-    for word in words:
-        if len(word) >= 3 and word in common_words:
-            return True
-    
-    # Alternative: Check if words look like English (have vowels and consonants)
-    for word in words:
-        if len(word) >= 4:
-            vowels = sum(1 for c in word if c in 'aeiou')
-            consonants = len(word) - vowels
-            # English words typically have both vowels and consonants
-            if vowels >= 1 and consonants >= 2:
-                return True
-    
-    return False
+    return extract_vanilla_level_names(vanilla_rom_data, tile_map) or {}
 
 
 def filter_level_names(
@@ -526,48 +233,18 @@ Examples:
     if args.verbose:
         print("", file=sys.stderr)
     
-    # Format output
-    output_lines = []
-    
-    if args.format == 'text':
-        for level_id in sorted(level_names.keys()):
-            info = level_names[level_id]
-            output_lines.append(f"Level 0x{level_id:03X}: {info['name']}")
-    
-    elif args.format == 'csv':
-        output_lines.append("LevelID,Name,ROMOffset,HexData")
-        for level_id in sorted(level_names.keys()):
-            info = level_names[level_id]
-            name = info['name'].replace('"', '""')  # Escape quotes
-            hex_data = info['raw_data'].hex()
-            output_lines.append(f'0x{level_id:03X},"{name}",0x{info["rom_offset"]:06X},{hex_data}')
-    
-    elif args.format == 'json':
-        import json
-        output_dict = {}
-        for level_id, info in level_names.items():
-            output_dict[f"0x{level_id:03X}"] = {
-                'name': info['name'],
-                'rom_offset': f"0x{info['rom_offset']:06X}",
-                'hex_data': info['raw_data'].hex()
-            }
-        output_lines.append(json.dumps(output_dict, indent=2, ensure_ascii=False))
-    
     # Write output
-    output_text = '\n'.join(output_lines)
-    
     if args.output:
         try:
-            with open(args.output, 'w', encoding='utf-8') as f:
-                f.write(output_text)
-                f.write('\n')
+            with open(args.output, 'w', encoding='utf-8', buffering=65536) as f:
+                write_level_names(f, level_names, args.format)
             if args.verbose:
                 print(f"Output written to {args.output}", file=sys.stderr)
         except IOError as e:
             print(f"Error writing output file: {e}", file=sys.stderr)
             return 1
     else:
-        print(output_text)
+        write_level_names(sys.stdout, level_names, args.format)
     
     return 0
 
@@ -7,8 +7,21 @@ but outputs in the database import format.
 
 import argparse
 import json
+import mmap
+import re
+import shutil
+import subprocess
 import sys
 import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+# Use orjson for JSON output when it is installed
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Import everything from the original script to ensure 100% identical logic
 from levelname_extractor3 import (
@@ -23,84 +36,88 @@ from levelname_extractor3 import (
     DEFAULT_TILE_MAP
 )
 
-def main():
-    parser = argparse.ArgumentParser(
-        description='Extract level names and output in database import format'
-    )
-    
-    parser.add_argument('--romfile', required=True, help='Path to ROM file')
-    parser.add_argument('--output', '-o', required=True, help='Output JSON file')
-    parser.add_argument('--gameid', required=True, help='Game ID')
-    parser.add_argument('--version', required=True, help='Game version')
-    parser.add_argument('--tile-map', help='Custom tile mapping file')
-    parser.add_argument('--show-graphics', action='store_true',
-                       help='Show graphic tile codes (default: hide)')
-    parser.add_argument('--range', nargs=2, metavar=('MIN', 'MAX'),
-                       help='Level ID range to extract (hex or decimal)')
-    parser.add_argument('--verbose', '-v', action='store_true',
-                       help='Verbose output')
-    
-    # Filtering options - EXACTLY the same as original script
-    parser.add_argument('--vanilla-rom', metavar='FILE',
-                       help='Path to vanilla ROM for comparison filtering')
-    parser.add_argument('--editedonly', action='store_true',
-                       help='Only show levels where level DATA has been edited (compares actual level content, requires --vanilla-rom)')
-    parser.add_argument('--novanilla', action='store_true',
-                       help='Filter out vanilla level names')
-    parser.add_argument('--withwords', action='store_true',
-                       help='Only show level names containing English words')
-    parser.add_argument('--levelsonly', action='store_true',
-                       help='Filter out message box text and extraneous content (uses pattern detection)')
+# Level files written by Lunar Magic's -ExportMultLevels: "MWL <level id>.mwl"
+_MWL_RE = re.compile(r"^MWL ([^.]+)\.mwl$")
+
+# Lunar Magic runs under wine; silence wine's debug channels unless the user set them.
+# Paths are absolute because each extraction runs in its own temporary directory.
+LM_EXE = os.path.abspath(os.path.join('lm333', 'lm333.exe'))
+LM_BASE_ROM = os.path.abspath('orig_lm333_noedits.sfc')
+WINE_ENV = dict(os.environ, WINEDEBUG=os.environ.get('WINEDEBUG', '-all'))
+
+
+def start_wineserver(persist_seconds=60):
+    """
+    Start a persistent wineserver so each Lunar Magic call attaches to a
+    running server instead of paying wine's startup cost again.
+    """
+    try:
+        subprocess.run(['wineserver', f'-p{persist_seconds}'], env=WINE_ENV,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        pass  # wine will start its own server on first use
+
+
+def run_lm(*lm_args, cwd=None, timeout=4):
+    """Run a Lunar Magic command line operation, raising if it fails or times out"""
+    try:
+        result = subprocess.run(['wine', LM_EXE, *lm_args], cwd=cwd, env=WINE_ENV,
+                                stdout=subprocess.DEVNULL, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise Exception(f"lm333.exe {lm_args[0]} timed out")
+    if result.returncode != 0:
+        raise Exception(f"lm333.exe {lm_args[0]} failed")
+
+def extract_one(args):
+    """
+    Extract level names from one ROM.
     
-    args = parser.parse_args()
+    Returns the database import dictionary for args.gameid, or None after
+    printing an error. Each call works in its own temporary directory, so
+    several ROMs can be processed at once by separate worker processes.
+    """
+    # levelset is shared module state; a batch worker runs many extractions
+    del levelset[:]
+
+    work_dir = tempfile.mkdtemp(prefix='lmlevelnames_')
+    try:
+        return _extract_in(work_dir, args)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
+def _extract_in(work_dir, args):
+    """Body of extract_one(), using work_dir for Lunar Magic's files"""
     # IMPORTANT: Use the EXACT same ROM loading logic as the original script
     # This populates the global levelset variable
-    import shutil
-    import glob
-    import re
-    
+    romfile = args.romfile
     try:
-        if not(os.path.exists("temp")):
-            os.mkdir("temp")
-        if os.path.exists("temp/temp_lm333.sfc"):
-            os.unlink("temp/temp_lm333.sfc")
-        shutil.copy("orig_lm333_noedits.sfc", "temp/temp_lm333.sfc")
-        shutil.copy(args.romfile, "temp/temp_analyze.sfc")
-        orig_path = os.getcwd()
-        os.chdir("temp")
-        for f in glob.glob("*.mwl"):
-            if re.match("^.*\.mwl$", f):
-                os.remove(f)
-        print("wine ../lm333/lm333.exe -TransferOverworld temp_lm333.sfc temp_analyze.sfc")
-        result = os.system('timeout 4 wine ../lm333/lm333.exe -TransferOverworld temp_lm333.sfc temp_analyze.sfc')
-        if not(result==0):
-            raise Exception("lm333.exe -TransferOVerworld failed")
-        result = os.system('timeout 4 wine ../lm333/lm333.exe -ExportMultLevels temp_analyze.sfc MWL 1')
-        if not(result==0):
-            raise Exception("lm333.exe -ExportMultLEvels failed")
-        for f in glob.glob("MWL*.mwl"):
-            result = re.match("^MWL ([^.]+)\.mwl$", f)
-            if result:
-                mgroup = result.groups(0)[0]
-                levelset.append(normalize_lid(mgroup))
-        os.chdir(orig_path)
-        args.romfile = 'temp/temp_lm333.sfc'
-
-        with open(args.romfile, 'rb') as f:
-            rom_data = f.read()
+        shutil.copy(LM_BASE_ROM, os.path.join(work_dir, "temp_lm333.sfc"))
+        shutil.copy(romfile, os.path.join(work_dir, "temp_analyze.sfc"))
+        print(f"wine {LM_EXE} -TransferOverworld temp_lm333.sfc temp_analyze.sfc")
+        run_lm('-TransferOverworld', 'temp_lm333.sfc', 'temp_analyze.sfc', cwd=work_dir)
+        run_lm('-ExportMultLevels', 'temp_analyze.sfc', 'MWL', '1', cwd=work_dir)
+        with os.scandir(work_dir) as it:
+            for entry in it:
+                m = _MWL_RE.match(entry.name)
+                if m:
+                    levelset.append(normalize_lid(m.group(1)))
+        romfile = os.path.join(work_dir, 'temp_lm333.sfc')
+
+        with open(romfile, 'rb') as f:
+            rom_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
     except FileNotFoundError:
-        print(f"Error: ROM file not found: {args.romfile}", file=sys.stderr)
-        return 1
-    except IOError as e:
+        print(f"Error: ROM file not found: {romfile}", file=sys.stderr)
+        return None
+    except (IOError, ValueError) as e:
+        # mmap raises ValueError for an empty file
         print(f"Error reading ROM file: {e}", file=sys.stderr)
-        return 1
+        return None
     
     # Detect header
     has_header, header_offset = detect_header(rom_data)
     
     if args.verbose:
-        print(f"ROM file: {args.romfile}", file=sys.stderr)
+        print(f"ROM file: {romfile}", file=sys.stderr)
         print(f"ROM size: {len(rom_data):,} bytes", file=sys.stderr)
         print(f"Header: {'Yes (512 bytes)' if has_header else 'No'}", file=sys.stderr)
     
@@ -114,7 +131,7 @@ def main():
     if not patch_installed:
         print("Error: Lunar Magic Level Names Patch not found in ROM", file=sys.stderr)
         print("This ROM may use vanilla level names or is not edited with Lunar Magic", file=sys.stderr)
-        return 1
+        return None
     
     # Load tile map
     if args.tile_map:
@@ -125,7 +142,7 @@ def main():
                       file=sys.stderr)
         except Exception as e:
             print(f"Error loading tile map: {e}", file=sys.stderr)
-            return 1
+            return None
     else:
         tile_map = DEFAULT_TILE_MAP
     
@@ -140,7 +157,7 @@ def main():
                 print(f"Extracting levels 0x{min_level:03X} to 0x{max_level:03X}", file=sys.stderr)
         except ValueError:
             print(f"Error: Invalid level range: {args.range}", file=sys.stderr)
-            return 1
+            return None
     
     # Extract level names - EXACT same call as original
     level_names = extract_level_names(rom_data, header_offset, tile_map, 
@@ -168,7 +185,7 @@ def main():
         
         try:
             with open(vanilla_rom_path, 'rb') as f:
-                vanilla_rom_data_for_edited = f.read()
+                vanilla_rom_data_for_edited = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
             _, vanilla_header_offset_for_edited = detect_header(vanilla_rom_data_for_edited)
             
             # Also load vanilla names if not already loaded
@@ -177,13 +194,14 @@ def main():
             
             if args.verbose:
                 print(f"Loaded vanilla ROM: {len(vanilla_rom_data_for_edited):,} bytes", file=sys.stderr)
-        except (FileNotFoundError, IOError) as e:
+        except (FileNotFoundError, IOError, ValueError) as e:
             if args.verbose:
                 print(f"Warning: Could not load vanilla ROM for level data comparison: {e}", file=sys.stderr)
-            print(f"ERROR: --editedonly requires a vanilla ROM file", file=sys.stderr)
-            sys.exit(1)
+            print("ERROR: --editedonly requires a vanilla ROM file", file=sys.stderr)
+            return None
     
     # Apply filters - EXACT same call as original script
+    # (memoryviews let the level data hashing slice the ROMs without copying)
     if args.editedonly or args.novanilla or args.withwords or args.levelsonly:
         original_count = len(level_names)
         level_names = filter_level_names(
@@ -193,8 +211,8 @@ def main():
             no_vanilla=args.novanilla,
             with_words=args.withwords,
             levels_only=args.levelsonly,
-            rom_data=rom_data,
-            vanilla_rom_data=vanilla_rom_data_for_edited,
+            rom_data=memoryview(rom_data),
+            vanilla_rom_data=memoryview(vanilla_rom_data_for_edited) if vanilla_rom_data_for_edited else None,
             header_offset=header_offset,
             vanilla_header_offset=vanilla_header_offset_for_edited
         )
@@ -205,29 +223,134 @@ def main():
         print("", file=sys.stderr)
     
     # Format output in the requested JSON format
-    output_data = {
+    return {
         args.gameid: {
             "version": args.version,
-            "levelnames": {}
+            "levelnames": {f"0x{level_id:03X}": sys.intern(level_names[level_id]['name'])
+                           for level_id in sorted(level_names)}
         }
     }
+
+def extract_batch(args):
+    """
+    Extract level names from every ROM listed in the args.batch manifest,
+    spreading the ROMs over args.jobs worker processes.
+    
+    Returns (output_data, failed_roms): the merged database import dictionary
+    of the ROMs that succeeded and the romfile of each ROM that failed.
+    output_data is None if the manifest is invalid or every ROM failed.
+    """
+    try:
+        with open(args.batch, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (IOError, ValueError) as e:
+        print(f"Error reading batch manifest: {e}", file=sys.stderr)
+        return None, []
+    
+    if not isinstance(manifest, list):
+        print("Error: batch manifest must be a JSON list", file=sys.stderr)
+        return None, []
+    tasks = []
+    for i, entry in enumerate(manifest):
+        if not isinstance(entry, dict):
+            print(f"Error: batch manifest entry {i} is not an object", file=sys.stderr)
+            return None, []
+        task = argparse.Namespace(**{**vars(args), **entry})
+        missing = [key for key in ('romfile', 'gameid', 'version') if not getattr(task, key)]
+        if missing:
+            print(f"Error: batch manifest entry {i} has no {', '.join(missing)}", file=sys.stderr)
+            return None, []
+        tasks.append(task)
     
-    for level_id in sorted(level_names.keys()):
-        info = level_names[level_id]
-        level_key = f"0x{level_id:03X}"
-        output_data[args.gameid]["levelnames"][level_key] = info['name']
+    output_data = {}
+    failed_roms = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(extract_one, task) for task in tasks]
+        for task, future in zip(tasks, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error processing {task.romfile}: {e}", file=sys.stderr)
+                result = None
+            if result is None:
+                failed_roms.append(task.romfile)
+            else:
+                output_data.update(result)
+    
+    if failed_roms and not output_data:
+        output_data = None
+    return output_data, failed_roms
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract level names and output in database import format'
+    )
+    
+    parser.add_argument('--romfile', help='Path to ROM file')
+    parser.add_argument('--output', '-o', required=True, help='Output JSON file')
+    parser.add_argument('--gameid', help='Game ID')
+    parser.add_argument('--version', help='Game version')
+    parser.add_argument('--tile-map', help='Custom tile mapping file')
+    parser.add_argument('--show-graphics', action='store_true',
+                       help='Show graphic tile codes (default: hide)')
+    parser.add_argument('--range', nargs=2, metavar=('MIN', 'MAX'),
+                       help='Level ID range to extract (hex or decimal)')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                       help='Verbose output')
+    
+    # Filtering options - EXACTLY the same as original script
+    parser.add_argument('--vanilla-rom', metavar='FILE',
+                       help='Path to vanilla ROM for comparison filtering')
+    parser.add_argument('--editedonly', action='store_true',
+                       help='Only show levels where level DATA has been edited (compares actual level content, requires --vanilla-rom)')
+    parser.add_argument('--novanilla', action='store_true',
+                       help='Filter out vanilla level names')
+    parser.add_argument('--withwords', action='store_true',
+                       help='Only show level names containing English words')
+    parser.add_argument('--levelsonly', action='store_true',
+                       help='Filter out message box text and extraneous content (uses pattern detection)')
+    
+    parser.add_argument('--batch', metavar='MANIFEST',
+                       help='JSON list of {"romfile", "gameid", "version"} objects to process in parallel '
+                            'instead of --romfile/--gameid/--version')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                       help='Worker processes for --batch (default: CPU count)')
+    
+    args = parser.parse_args()
+    if not args.batch and not (args.romfile and args.gameid and args.version):
+        parser.error('--romfile, --gameid and --version are required unless --batch is given')
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    start_wineserver()
+    if args.batch:
+        output_data, failed_roms = extract_batch(args)
+    else:
+        output_data, failed_roms = extract_one(args), []
+    if output_data is None:
+        return 1
     
     # Write JSON output
     try:
-        with open(args.output, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
-            f.write('\n')
+        if ORJSON_AVAILABLE:
+            payload = orjson.dumps(output_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        else:
+            payload = json.dumps(output_data, indent=2, ensure_ascii=False).encode('utf-8')
+        with open(args.output, 'wb') as f:
+            f.write(payload)
+            f.write(b'\n')
         if args.verbose:
             print(f"Output written to {args.output}", file=sys.stderr)
     except IOError as e:
         print(f"Error writing output file: {e}", file=sys.stderr)
         return 1
     
+    if failed_roms:
+        print(f"Error: {len(failed_roms)} ROM(s) failed:", file=sys.stderr)
+        for romfile in failed_roms:
+            print(f"  {romfile}", file=sys.stderr)
+        return 1
+    
     return 0
 
 if __name__ == '__main__':
@@ -4,8 +4,10 @@ Reverse-engineer tile mapping using known level names
 Compares known text with raw bytes to deduce character mappings
 """
 
+import mmap
+import os
 import sys
-from collections import defaultdict
+from collections import Counter
 
 DEFAULT_TILE_MAP = {
     0x00: 'A', 0x01: 'B', 0x02: 'C', 0x03: 'D', 0x04: 'E', 0x05: 'F',
@@ -42,12 +44,24 @@ def load_known_names(filename):
     
     return known_names
 
-def extract_raw_level_data(rom_data, offset, level_id):
-    """Extract raw 19-byte level name data"""
-    level_offset = offset + (level_id * 19)
-    return rom_data[level_offset:level_offset+19]
+def build_decode_table(tile_map):
+    """Build a str.translate() table for decoding tile bytes; unknown tiles become '?'"""
+    return {b: tile_map.get(b, '?') for b in range(256)}
 
-def analyze_character_mappings(rom_data, offset, known_names):
+def decode_tiles(raw_bytes, decode_table):
+    """Decode tile bytes with a table from build_decode_table()"""
+    return bytes(raw_bytes).decode('latin-1').translate(decode_table).rstrip()
+
+def read_name_table(rom_data, offset, num_levels):
+    """Read the 19-byte level name records for levels 0..num_levels-1 in one slice"""
+    return memoryview(rom_data[offset:offset + num_levels * 19])
+
+def extract_raw_level_data(name_table, level_id):
+    """Extract raw 19-byte level name data (a view into name_table)"""
+    level_offset = level_id * 19
+    return name_table[level_offset:level_offset+19]
+
+def analyze_character_mappings(name_table, known_names, upper_names, verbose=True):
     """
     Compare known names with raw bytes to deduce tile mappings
     """
@@ -56,47 +70,35 @@ def analyze_character_mappings(rom_data, offset, known_names):
     print("=" * 80)
     print()
     
-    # Store potential mappings: byte_value -> {character: count}
-    byte_to_char_candidates = defaultdict(lambda: defaultdict(int))
+    # Store potential mappings: one {character: count} per byte value
+    byte_to_char_candidates = [Counter() for _ in range(256)]
+    decode_table = build_decode_table(DEFAULT_TILE_MAP)
     
     # For each known level name
     for level_id, known_name in sorted(known_names.items()):
-        raw_bytes = extract_raw_level_data(rom_data, offset, level_id)
-        
-        print(f"Level 0x{level_id:03X}: {known_name}")
-        print(f"  Raw: {' '.join(f'{b:02X}' for b in raw_bytes)}")
-        
-        # Pad name to 19 characters
-        padded_name = known_name.ljust(19)
+        raw_bytes = extract_raw_level_data(name_table, level_id)
         
-        # Compare byte-by-byte
-        for i, (byte_val, char) in enumerate(zip(raw_bytes, padded_name)):
-            if char == ' ' and i >= len(known_name):
-                # Trailing space/padding
-                byte_to_char_candidates[byte_val]['[BLANK]'] += 1
-            elif char == ' ':
-                # Space within name
-                byte_to_char_candidates[byte_val][' '] += 1
-            else:
-                # Actual character
-                byte_to_char_candidates[byte_val][char] += 1
+        # Compare byte-by-byte; spaces within the name count as ' '
+        for byte_val, char in zip(raw_bytes, known_name):
+            byte_to_char_candidates[byte_val][char] += 1
         
-        # Try to decode with current mapping
-        decoded = []
-        for b in raw_bytes:
-            if b in DEFAULT_TILE_MAP:
-                decoded.append(DEFAULT_TILE_MAP[b])
-            else:
-                decoded.append(f'?')
+        # Bytes past the end of the name are trailing padding
+        for byte_val in raw_bytes[len(known_name):]:
+            byte_to_char_candidates[byte_val]['[BLANK]'] += 1
         
-        decoded_str = ''.join(decoded).rstrip()
-        match = "MATCH!" if decoded_str.upper() == known_name.upper() else "MISMATCH"
-        print(f"  Current decode: {decoded_str} [{match}]")
-        print()
+        if verbose:
+            print(f"Level 0x{level_id:03X}: {known_name}")
+            print(f"  Raw: {' '.join(f'{b:02X}' for b in raw_bytes)}")
+            
+            # Try to decode with current mapping
+            decoded_str = decode_tiles(raw_bytes, decode_table)
+            match = "MATCH!" if decoded_str.upper() == upper_names[level_id] else "MISMATCH"
+            print(f"  Current decode: {decoded_str} [{match}]")
+            print()
     
     return byte_to_char_candidates
 
-def deduce_mapping(byte_to_char_candidates):
+def deduce_mapping(byte_to_char_candidates, verbose=True):
     """
     Deduce the most likely character mapping for each byte
     """
@@ -107,26 +109,25 @@ def deduce_mapping(byte_to_char_candidates):
     
     deduced_map = {}
     
-    # Sort by byte value
-    for byte_val in sorted(byte_to_char_candidates.keys()):
-        candidates = byte_to_char_candidates[byte_val]
-        
+    # In byte value order
+    for byte_val, candidates in enumerate(byte_to_char_candidates):
         # Find most common character for this byte
         if candidates:
-            most_common_char = max(candidates.items(), key=lambda x: x[1])
-            char, count = most_common_char
-            
-            # Show all candidates
-            all_candidates = ', '.join(f"{c}({n})" for c, n in sorted(candidates.items(), key=lambda x: x[1], reverse=True))
+            ranked = candidates.most_common()
+            char, count = ranked[0]
             
             deduced_map[byte_val] = char if char != '[BLANK]' else ' '
             
-            # Check against default mapping
-            default = DEFAULT_TILE_MAP.get(byte_val, '???')
-            match_str = "[OK]" if default == deduced_map[byte_val] else f"[DIFF: was '{default}']"
-            
-            print(f"${byte_val:02X} -> '{deduced_map[byte_val]}' {match_str}")
-            print(f"      Candidates: {all_candidates}")
+            if verbose:
+                # Show all candidates
+                all_candidates = ', '.join(f"{c}({n})" for c, n in ranked)
+                
+                # Check against default mapping
+                default = DEFAULT_TILE_MAP.get(byte_val, '???')
+                match_str = "[OK]" if default == deduced_map[byte_val] else f"[DIFF: was '{default}']"
+                
+                print(f"${byte_val:02X} -> '{deduced_map[byte_val]}' {match_str}")
+                print(f"      Candidates: {all_candidates}")
     
     return deduced_map
 
@@ -157,9 +158,10 @@ def generate_corrected_mapping(deduced_map):
     
     return corrected
 
-def test_mapping(rom_data, offset, known_names, tile_map):
+def test_mapping(name_table, known_names, upper_names, tile_map, verbose=True):
     """
     Test the corrected mapping against known names
+    (only failures are listed unless verbose)
     """
     print("\n" + "=" * 80)
     print("TESTING CORRECTED MAPPING")
@@ -168,24 +170,21 @@ def test_mapping(rom_data, offset, known_names, tile_map):
     
     matches = 0
     total = 0
+    decode_table = build_decode_table(tile_map)
     
     for level_id, known_name in sorted(known_names.items()):
-        raw_bytes = extract_raw_level_data(rom_data, offset, level_id)
-        
-        decoded = []
-        for b in raw_bytes:
-            if b in tile_map:
-                decoded.append(tile_map[b])
-            else:
-                decoded.append('?')
+        raw_bytes = extract_raw_level_data(name_table, level_id)
         
-        decoded_str = ''.join(decoded).rstrip()
+        decoded_str = decode_tiles(raw_bytes, decode_table)
         
         # Compare (case-insensitive)
-        match = decoded_str.upper() == known_name.upper()
+        match = decoded_str.upper() == upper_names[level_id]
         matches += 1 if match else 0
         total += 1
         
+        if match and not verbose:
+            continue
+        
         status = "[OK]" if match else "[FAIL]"
         print(f"Level 0x{level_id:03X}: {status}")
         print(f"  Expected: {known_name}")
@@ -222,14 +221,18 @@ def export_mapping(tile_map, filename='invictus_tile_map.py'):
     print(f"\nMapping exported to: {filename}")
 
 def main():
-    if len(sys.argv) < 4:
-        print("Usage: python reverse_engineer_mapping.py <rom_file> <offset_hex> <known_names_file>")
+    # --quiet drops the per-level and per-byte detail, keeping the summaries
+    args = [arg for arg in sys.argv[1:] if arg not in ('--quiet', '-q')]
+    verbose = len(args) == len(sys.argv) - 1
+    
+    if len(args) < 3:
+        print("Usage: python reverse_engineer_mapping.py [--quiet] <rom_file> <offset_hex> <known_names_file>")
         print("Example: python reverse_engineer_mapping.py Invictus_1.1.sfc 3DE1F6 invictus_exits_incomplete.txt")
         sys.exit(1)
     
-    rom_path = sys.argv[1]
-    offset = int(sys.argv[2], 16)
-    known_names_file = sys.argv[3]
+    rom_path = args[0]
+    offset = int(args[1], 16)
+    known_names_file = args[2]
     
     print(f"ROM: {rom_path}")
     print(f"Data offset: ${offset:06X}")
@@ -238,22 +241,33 @@ def main():
     
     # Load data
     with open(rom_path, 'rb') as f:
-        rom_data = bytearray(f.read())
+        # Map the ROM read-only; only the name table pages are ever touched.
+        # mmap rejects empty files, which read as empty data instead
+        if os.fstat(f.fileno()).st_size:
+            rom_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            rom_data = b''
     
     known_names = load_known_names(known_names_file)
     print(f"Loaded {len(known_names)} known level names\n")
     
+    # Names are compared case-insensitively; uppercase them once
+    upper_names = {level_id: name.upper() for level_id, name in known_names.items()}
+    
+    # Read every record up to the highest known level in one slice
+    name_table = read_name_table(rom_data, offset, max(known_names, default=-1) + 1)
+    
     # Analyze
-    byte_to_char = analyze_character_mappings(rom_data, offset, known_names)
+    byte_to_char = analyze_character_mappings(name_table, known_names, upper_names, verbose)
     
     # Deduce mapping
-    deduced_map = deduce_mapping(byte_to_char)
+    deduced_map = deduce_mapping(byte_to_char, verbose)
     
     # Generate corrected mapping
     corrected_map = generate_corrected_mapping(deduced_map)
     
     # Test it
-    matches, total = test_mapping(rom_data, offset, known_names, corrected_map)
+    matches, total = test_mapping(name_table, known_names, upper_names, corrected_map, verbose)
     
     # Export
     if matches == total:
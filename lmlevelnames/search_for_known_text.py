@@ -4,8 +4,21 @@ Search ROM for known level name text patterns
 Convert text to tile bytes and search
 """
 
+import mmap
+import os
 import sys
 
+# Use pyahocorasick to search for every name in one pass when it is installed
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# find_patterns hands the ROM to pyahocorasick in chunks of this many bytes,
+# so only one chunk at a time is copied out of the mmap
+_AHOCORASICK_CHUNK_SIZE = 1 << 20
+
 DEFAULT_TILE_MAP = {
     'A': 0x00, 'B': 0x01, 'C': 0x02, 'D': 0x03, 'E': 0x04, 'F': 0x05,
     'G': 0x06, 'H': 0x07, 'I': 0x08, 'J': 0x09, 'K': 0x0A, 'L': 0x0B,
@@ -22,25 +35,106 @@ DEFAULT_TILE_MAP = {
     '/': 0x48, ':': 0x49, ' ': 0xFC
 }
 
+class TileTranslation(dict):
+    """
+    str.translate() table that turns text into tile codes (as chr() values).
+    Characters missing from the tile map fall back to their uppercase form,
+    and are dropped if that is missing too. Lookups are cached.
+    """
+    def __init__(self, tile_map):
+        super().__init__({ord(char): chr(tile) for char, tile in tile_map.items()})
+        self.tile_map = tile_map
+    
+    def __missing__(self, code):
+        tile = self.tile_map.get(chr(code).upper())
+        value = None if tile is None else chr(tile)
+        self[code] = value
+        return value
+
+_DEFAULT_TILE_TRANSLATION = TileTranslation(DEFAULT_TILE_MAP)
+
 def text_to_tiles(text, tile_map):
     """Convert text to tile bytes"""
-    tiles = []
-    for char in text:
-        if char in tile_map:
-            tiles.append(tile_map[char])
-        else:
-            # Try uppercase
-            if char.upper() in tile_map:
-                tiles.append(tile_map[char.upper()])
-    return bytes(tiles)
+    if tile_map is DEFAULT_TILE_MAP:
+        table = _DEFAULT_TILE_TRANSLATION
+    else:
+        table = TileTranslation(tile_map)
+    return text.translate(table).encode('latin-1')
 
-def search_pattern(rom_data, pattern, name):
-    """Search for byte pattern in ROM"""
+def find_pattern(rom_data, pattern):
+    """Find every offset of a byte pattern in ROM; an empty pattern has none"""
     matches = []
+    if not pattern:
+        return matches
     
-    for i in range(len(rom_data) - len(pattern)):
-        if rom_data[i:i+len(pattern)] == pattern:
-            matches.append(i)
+    # bytes.find runs the scan in C; restart one past each hit so
+    # overlapping matches are still reported. Like the original
+    # range(len(rom_data) - len(pattern)) scan, a match ending on the
+    # last ROM byte is not reported.
+    end = len(rom_data) - 1
+    i = rom_data.find(pattern, 0, end)
+    while i >= 0:
+        matches.append(i)
+        i = rom_data.find(pattern, i + 1, end)
+    
+    return matches
+
+def find_patterns(rom_data, patterns):
+    """
+    Find every offset of each byte pattern in {name: pattern}.
+    With pyahocorasick the ROM is scanned once for all patterns,
+    otherwise each pattern is searched separately. Both report the
+    same offsets as find_pattern(), and empty patterns have no matches.
+    """
+    if not AHOCORASICK_AVAILABLE:
+        return {name: find_pattern(rom_data, pattern) for name, pattern in patterns.items()}
+    
+    # Unicode builds of pyahocorasick only take str; latin-1 maps bytes 1:1
+    if ahocorasick.unicode:
+        convert = lambda data: str(data, 'latin-1')
+    else:
+        convert = bytes
+    
+    # Several names can share one pattern, so each key holds a list of names
+    automaton = ahocorasick.Automaton()
+    for name, pattern in patterns.items():
+        if not pattern:
+            continue
+        key = convert(pattern)
+        if key in automaton:
+            automaton.get(key)[1].append(name)
+        else:
+            automaton.add_word(key, (len(pattern), [name]))
+    
+    matches = {name: [] for name in patterns}
+    if not len(automaton):
+        return matches
+    automaton.make_automaton()
+    
+    # Each chunk starts early enough to hold any match ending inside it;
+    # matches ending in that overlap were reported with the previous chunk.
+    # Like find_pattern(), matches ending on the last ROM byte are skipped.
+    overlap = max(len(pattern) for pattern in patterns.values()) - 1
+    view = memoryview(rom_data)
+    limit = len(rom_data) - 1
+    start = 0
+    while start < limit:
+        stop = min(start + _AHOCORASICK_CHUNK_SIZE, limit)
+        base = max(start - overlap, 0)
+        for end, (length, names) in automaton.iter(convert(view[base:stop])):
+            end += base
+            if end < start:
+                continue
+            for name in names:
+                matches[name].append(end - length + 1)
+        start = stop
+    
+    return matches
+
+def search_pattern(rom_data, pattern, name, matches=None):
+    """Search for byte pattern in ROM, or report matches found by find_patterns()"""
+    if matches is None:
+        matches = find_pattern(rom_data, pattern)
     
     if matches:
         print(f"\nFound '{name}':")
@@ -68,7 +162,12 @@ def main():
     rom_path = sys.argv[1]
     
     with open(rom_path, 'rb') as f:
-        rom_data = bytearray(f.read())
+        # Map the ROM read-only; pages are faulted in as the search touches them.
+        # mmap rejects empty files, which read as empty data instead
+        if os.fstat(f.fileno()).st_size:
+            rom_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            rom_data = b''
     
     print(f"Searching ROM: {rom_path}")
     print(f"ROM Size: {len(rom_data):,} bytes")
@@ -91,13 +190,15 @@ def main():
     print("SEARCHING FOR KNOWN LEVEL NAMES (Standard Tile Mapping)")
     print("=" * 80)
     
+    patterns = {name: text_to_tiles(name, DEFAULT_TILE_MAP) for name in search_names}
+    found = find_patterns(rom_data, patterns)
+    
     all_matches = {}
-    for name in search_names:
-        pattern = text_to_tiles(name, DEFAULT_TILE_MAP)
+    for name, pattern in patterns.items():
         print(f"\nSearching for: {name}")
         print(f"  Pattern: {' '.join(f'{b:02X}' for b in pattern)}")
         
-        matches = search_pattern(rom_data, pattern, name)
+        matches = search_pattern(rom_data, pattern, name, found[name])
         if matches:
             all_matches[name] = matches
         else:
@@ -111,10 +212,13 @@ def main():
     
     if all_matches:
         print("\nUnique ROM offsets found:")
-        unique_offsets = sorted(set(offset for matches in all_matches.values() for offset in matches))
+        names_at_offset = {}
+        for name, matches in all_matches.items():
+            for offset in matches:
+                names_at_offset.setdefault(offset, []).append(name)
+        unique_offsets = sorted(names_at_offset)
         for offset in unique_offsets:
-            names_at_offset = [name for name, matches in all_matches.items() if offset in matches]
-            print(f"  ${offset:06X}: {', '.join(names_at_offset)}")
+            print(f"  ${offset:06X}: {', '.join(names_at_offset[offset])}")
         
         # Check if they cluster around any address
         if len(unique_offsets) > 1:
@@ -1,4 +1,4 @@
-import struct
+import mmap
 
 def snes_to_rom_offset(snes_addr, header_offset=0):
     bank = (snes_addr >> 16) & 0xFF
@@ -11,7 +11,8 @@ def snes_to_rom_offset(snes_addr, header_offset=0):
 
 rom_file = 'Akogare_v121_lm.sfc'
 with open(rom_file, 'rb') as f:
-    rom_data = f.read()
+    # Map the ROM read-only; only the few bytes checked below are paged in
+    rom_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
 is_headered = len(rom_data) % 0x400 == 0x200
 header_offset = 512 if is_headered else 0
@@ -31,9 +32,7 @@ if hijack_byte == 0x22:
     # Read pointer
     snes_pointer_addr = 0x03BB57
     rom_pointer_addr = snes_to_rom_offset(snes_pointer_addr, header_offset)
-    patch_pointer = (rom_data[rom_pointer_addr] | 
-                     rom_data[rom_pointer_addr + 1] << 8 | 
-                     rom_data[rom_pointer_addr + 2] << 16)
+    patch_pointer = int.from_bytes(rom_data[rom_pointer_addr:rom_pointer_addr + 3], 'little')
     print(f'Block 0 pointer: SNES ${patch_pointer:06X}')
     
     # Check if block 1 exists at same relative location
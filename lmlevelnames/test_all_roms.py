@@ -1,83 +1,109 @@
 #!/usr/bin/env python3
 """
-Test levelname_extractor2.py against all ROMs in testrom/ directory
+Test a level name extractor (levelname_extractor2.py by default) against
+all ROMs in testrom/ directory
 """
 
+import argparse
+import contextlib
+import importlib
+import io
 import os
-import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def test_rom(rom_path):
-    """Test a single ROM with various filter combinations"""
+def test_rom(rom_path, extractor_name='levelname_extractor2'):
+    """
+    Test a single ROM with various filter combinations.
+    Returns the report as a string so parallel runs don't interleave.
+    """
+    extractor = importlib.import_module(extractor_name)
+    out = io.StringIO()
     rom_name = os.path.basename(rom_path)
     
-    print(f"\n{'='*80}")
-    print(f"Testing: {rom_name}")
-    print(f"{'='*80}\n")
+    print(f"\n{'='*80}", file=out)
+    print(f"Testing: {rom_name}", file=out)
+    print(f"{'='*80}\n", file=out)
     
     tests = [
         {
             'name': 'Basic extraction',
-            'args': ['--romfile', rom_path]
+            'filters': {}
         },
         {
             'name': 'Filter vanilla names',
-            'args': ['--romfile', rom_path, '--novanilla']
+            'filters': {'no_vanilla': True}
         },
         {
             'name': 'Levels only (no message boxes)',
-            'args': ['--romfile', rom_path, '--levelsonly']
+            'filters': {'levels_only': True}
         },
         {
             'name': 'Combined: no vanilla + levels only',
-            'args': ['--romfile', rom_path, '--novanilla', '--levelsonly']
+            'filters': {'no_vanilla': True, 'levels_only': True}
         },
         {
             'name': 'With English words only',
-            'args': ['--romfile', rom_path, '--novanilla', '--levelsonly', '--withwords']
+            'filters': {'no_vanilla': True, 'levels_only': True, 'with_words': True}
         },
     ]
     
+    # Parse the ROM once and run every filter combination on the same
+    # extraction, as the extractor script would for each set of flags
+    error = None
+    try:
+        with open(rom_path, 'rb') as f:
+            rom_data = f.read()
+        _, header_offset = extractor.detect_header(rom_data)
+        if extractor.check_level_names_patch(rom_data, header_offset):
+            # The extractor prints debug lines to stdout; keep them out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                level_names = extractor.extract_level_names(rom_data, header_offset,
+                                                            extractor.DEFAULT_TILE_MAP)
+            vanilla_names = extractor.load_vanilla_level_names(None, extractor.DEFAULT_TILE_MAP)
+        else:
+            error = "Lunar Magic Level Names Patch not found in ROM"
+    except Exception as e:
+        error = f"Exception: {e}"
+    
     for test in tests:
-        print(f"  Test: {test['name']}")
+        print(f"  Test: {test['name']}", file=out)
+        
+        if error:
+            print(f"    [FAIL] Failed: {error}", file=out)
+            continue
         
         try:
-            result = subprocess.run(
-                ['python', 'levelname_extractor2.py'] + test['args'],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            names = extractor.filter_level_names(level_names, vanilla_names, **test['filters'])
+            
+            # Level names, in the extractor's text output order
+            lines = [f"Level 0x{level_id:03X}: {names[level_id]['name']}" for level_id in sorted(names)]
+            print(f"    [OK] Success: {len(lines)} level names", file=out)
             
-            if result.returncode == 0:
-                # Count level names in output
-                level_count = len([line for line in result.stdout.split('\n') if line.startswith('Level 0x')])
-                print(f"    [OK] Success: {level_count} level names")
-                
-                # Show first 3 level names as sample
-                lines = [line for line in result.stdout.split('\n') if line.startswith('Level 0x')]
-                if lines:
-                    print(f"    Sample: {lines[0]}")
-                    if len(lines) > 1:
-                        print(f"            {lines[1]}")
-                    if len(lines) > 2:
-                        print(f"            {lines[2]}")
-            else:
-                print(f"    [FAIL] Failed: {result.returncode}")
-                if result.stderr:
-                    print(f"    Error: {result.stderr[:200]}")
+            # Show first 3 level names as sample
+            if lines:
+                print(f"    Sample: {lines[0]}", file=out)
+                if len(lines) > 1:
+                    print(f"            {lines[1]}", file=out)
+                if len(lines) > 2:
+                    print(f"            {lines[2]}", file=out)
         
-        except subprocess.TimeoutExpired:
-            print(f"    [TIMEOUT] Timeout")
         except Exception as e:
-            print(f"    [ERROR] Exception: {e}")
+            print(f"    [ERROR] Exception: {e}", file=out)
     
-    print()
+    print(file=out)
+    return out.getvalue()
 
 def main():
     """Test all ROMs in testrom/ directory"""
+    parser = argparse.ArgumentParser(description='Test a level name extractor against a directory of ROMs')
+    parser.add_argument('--extractor', default='levelname_extractor2',
+                        help='Extractor module to test, e.g. levelname_extractor3 (default: levelname_extractor2)')
+    parser.add_argument('--rom-dir', default='testrom',
+                        help='Directory of .sfc files to test (default: testrom)')
+    args = parser.parse_args()
     
-    testrom_dir = 'testrom'
+    testrom_dir = args.rom_dir
     
     if not os.path.exists(testrom_dir):
         print(f"ERROR: Directory '{testrom_dir}' not found")
@@ -93,9 +119,12 @@ def main():
     
     print(f"\nFound {len(rom_files)} ROM files to test\n")
     
-    for rom_file in rom_files:
-        rom_path = os.path.join(testrom_dir, rom_file)
-        test_rom(rom_path)
+    # Extraction runs in-process, so use worker processes to test ROMs in parallel;
+    # reports are printed in ROM order as they complete
+    rom_paths = [os.path.join(testrom_dir, rom_file) for rom_file in rom_files]
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for report in executor.map(test_rom, rom_paths, [args.extractor] * len(rom_paths)):
+            print(report, end='')
     
     print(f"\n{'='*80}")
     print(f"Completed testing {len(rom_files)} ROM files")
@@ -1,10 +1,39 @@
 #!/usr/bin/env python3
 """Test the enhanced filtering features."""
 
-import subprocess
-import sys
+import io
+import mmap
 
-def test_filtering(rom_file, description):
+import levelname_extractor_enhanced_2025_10_28 as extractor
+
+VANILLA_ROM = "orig_lm333_noedits.sfc"
+
+def extract_text(rom_file, first, last, vanilla_names=None, **filters):
+    """
+    Extract levels first..last from rom_file and return them as the enhanced
+    extractor's text output, or None if the ROM cannot be read or has no
+    level names patch.
+    """
+    try:
+        with open(rom_file, 'rb') as f:
+            rom_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, IOError, ValueError):
+        return None
+    
+    _, header_offset = extractor.detect_header(rom_data)
+    if not extractor.check_level_names_patch(rom_data, header_offset):
+        return None
+    
+    level_names = extractor.extract_level_names(rom_data, header_offset, extractor.DEFAULT_TILE_MAP,
+                                                False, (first, last))
+    if filters:
+        level_names = extractor.filter_level_names(level_names, vanilla_names, **filters)
+    
+    out = io.StringIO()
+    extractor.write_level_names(out, level_names, 'text')
+    return out.getvalue()
+
+def test_filtering(rom_file, description, vanilla_names):
     """Test various filtering options on a ROM."""
     print(f"\n{'='*70}")
     print(f"Testing: {rom_file}")
@@ -12,24 +41,19 @@ def test_filtering(rom_file, description):
     print('='*70)
     
     tests = [
-        ("No filters", []),
-        ("--novanilla", ["--novanilla"]),
-        ("--withwords", ["--withwords"]),
-        ("--novanilla --withwords", ["--novanilla", "--withwords"]),
+        ("No filters", {}),
+        ("--novanilla", {'no_vanilla': True}),
+        ("--withwords", {'with_words': True}),
+        ("--novanilla --withwords", {'no_vanilla': True, 'with_words': True}),
     ]
     
+    # Run all filter combinations in-process, so the ROM is mapped and
+    # parsed here rather than by one extractor subprocess per test
     for test_name, filters in tests:
-        cmd = [
-            sys.executable,
-            "levelname_extractor_enhanced_2025_10_28.py",
-            "--romfile", rom_file,
-            "--range", "0x001", "0x020"
-        ] + filters
+        output = extract_text(rom_file, 0x001, 0x020, vanilla_names, **filters)
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            count = result.stdout.count('Level 0x')
+        if output is not None:
+            count = output.count('Level 0x')
             print(f"  {test_name:30s}: {count:3d} levels")
         else:
             print(f"  {test_name:30s}: ERROR")
@@ -44,45 +68,32 @@ def main():
         ("smw_lm2.sfc", "Partially edited ROM"),
     ]
     
+    # --novanilla compares against the names in the vanilla ROM; load them once
+    vanilla_names = extractor.load_vanilla_level_names(VANILLA_ROM, extractor.DEFAULT_TILE_MAP)
+    
     for rom_file, description in test_roms:
-        test_filtering(rom_file, description)
+        test_filtering(rom_file, description, vanilla_names)
     
     print(f"\n{'='*70}")
     print("DETAILED EXAMPLE: Comparing vanilla vs edited")
     print('='*70)
     
     # Test with vanilla ROM
-    print("\nVanilla ROM (orig_lm333_noedits.sfc):")
-    cmd = [
-        sys.executable,
-        "levelname_extractor_enhanced_2025_10_28.py",
-        "--romfile", "orig_lm333_noedits.sfc",
-        "--range", "0x001", "0x010",
-        "--withwords"
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode == 0:
-        for line in result.stdout.strip().split('\n')[:5]:
+    print(f"\nVanilla ROM ({VANILLA_ROM}):")
+    output = extract_text(VANILLA_ROM, 0x001, 0x010, with_words=True)
+    if output is not None:
+        for line in output.strip().split('\n')[:5]:
             print(f"  {line}")
-        count = result.stdout.count('Level 0x')
+        count = output.count('Level 0x')
         print(f"  ... Total: {count} levels with words")
     
     # Test with edited ROM
     print("\nEdited ROM (Akogare_lm333_edited.sfc) with --withwords:")
-    cmd = [
-        sys.executable,
-        "levelname_extractor_enhanced_2025_10_28.py",
-        "--romfile", "Akogare_lm333_edited.sfc",
-        "--range", "0x001", "0x010",
-        "--withwords"
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode == 0:
-        for line in result.stdout.strip().split('\n')[:5]:
+    output = extract_text("Akogare_lm333_edited.sfc", 0x001, 0x010, with_words=True)
+    if output is not None:
+        for line in output.strip().split('\n')[:5]:
             print(f"  {line}")
-        count = result.stdout.count('Level 0x')
+        count = output.count('Level 0x')
         print(f"  ... Total: {count} levels with words")
     
     print(f"\n{'='*70}")
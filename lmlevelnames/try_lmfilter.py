@@ -1,10 +1,26 @@
 import sys
 import os
 import shutil
+import subprocess
 import json
 import glob
 import re
 
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# ioctl request for a copy-on-write clone of a whole file (FICLONE in linux/fs.h)
+FICLONE = 0x40049409
+
+# Level files written by Lunar Magic's -ExportMultLevels: "MWL <level id>.mwl"
+_MWL_RE = re.compile(r"^MWL ([^.]+)\.mwl$")
+
+# Size Lunar Magic's -ExpandROM 4MB produces
+EXPANDED_ROM_SIZE = 4 * 1024 * 1024
+
 levelset = []
 def normalize_lid(val):
     lid=str(val)
@@ -14,92 +30,104 @@ def normalize_lid(val):
     return lid
 gametag=os.environ['GAMETAG']
 
+def clone_file(src, dst):
+    """
+    Copy src to dst. On copy-on-write filesystems (btrfs, XFS) the copy is a
+    reflink sharing src's blocks; anywhere else it falls back to shutil.copy
+    """
+    if FCNTL_AVAILABLE:
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except OSError:
+            pass  # not supported here, or src and dst are on different filesystems
+    shutil.copy(src, dst)
+
+def run_lm(message, *lm_args, timeout=3):
+    """Run lm361.exe under wine, raising Exception(message) if it fails or times out"""
+    try:
+        result = subprocess.run(["wine", "../lm361/lm361.exe", *lm_args], timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise Exception(message)
+    if result.returncode != 0:
+        raise Exception(message)
+
 if not(os.path.exists("temp")):
    sys.mkdir("temp")
 
-if os.path.exists("temp/temp_lm361.sfc"):
-    os.unlink("temp/temp_lm361.sfc")
-shutil.copy("orig_lm361_noedits.sfc", "temp/temp_lm361.sfc")
-shutil.copy(os.environ["ROMFILE"], "temp/temp_analyze.sfc")
+clone_file(os.environ["ROMFILE"], "temp/temp_analyze.sfc")
 if os.path.exists("temp/Graphics"):
     shutil.rmtree("temp/Graphics")
 if os.path.exists("temp/ExGraphics"):
     shutil.rmtree("temp/ExGraphics")
+# Lunar Magic runs under wine; silence wine's debug channels unless the user set them,
+# and start one persistent wineserver so the lm361.exe calls below all attach to it
+# instead of each paying wine's startup cost
+os.environ.setdefault("WINEDEBUG", "-all")
+try:
+    subprocess.run(["wineserver", "-p60"], timeout=10)
+except (OSError, subprocess.SubprocessError):
+    pass  # wine will start its own server on first use
+
 orig_path = os.getcwd()
 os.chdir("temp")
-for f in glob.glob("*.mwl"):
-      if re.match("^.*\.mwl$", f):
-          os.remove(f)
+for f in glob.iglob("*.mwl"):
+      os.remove(f)
 
-result = os.system("timeout 3  wine ../lm361/lm361.exe -ExpandROM temp_lm361.sfc 4MB")
-if not(result==0):
-   raise Exception("lm333.exe -ExpandRom 4MB failed")
+# -ExpandROM is the slowest Lunar Magic call, so keep an expanded copy of the
+# clean ROM in temp/ and only rebuild it when orig_lm361_noedits.sfc changes
+orig_rom = os.path.join(orig_path, "orig_lm361_noedits.sfc")
+if (not os.path.exists("expanded_lm361.sfc")
+        or os.path.getmtime("expanded_lm361.sfc") < os.path.getmtime(orig_rom)):
+    clone_file(orig_rom, "expanded_lm361.sfc")
+if os.path.getsize("expanded_lm361.sfc") < EXPANDED_ROM_SIZE:
+    run_lm("lm333.exe -ExpandRom 4MB failed", "-ExpandROM", "expanded_lm361.sfc", "4MB")
 
-result =os.system("timeout 3 wine ../lm361/lm361.exe -DeleteLevels temp_lm361.sfc -AllLevels -ClearOrigLevelArea")
-if not(result==0):
-   raise Exception("lm333.exe -DeleteLEvels temp_lm361.sfc failed")
+if os.path.exists("temp_lm361.sfc"):
+    os.unlink("temp_lm361.sfc")
+clone_file("expanded_lm361.sfc", "temp_lm361.sfc")
 
-result = os.system("timeout 3 wine ../lm361/lm361.exe -ExportGFX temp_analyze.sfc")
-if not(result==0):
-   raise Exception("ExoprtGFX temp_analyze.sfc failed")
+run_lm("lm333.exe -DeleteLEvels temp_lm361.sfc failed", "-DeleteLevels", "temp_lm361.sfc", "-AllLevels", "-ClearOrigLevelArea")
 
-result = os.system("timeout 3 wine ../lm361/lm361.exe -ExportExGFX temp_analyze.sfc")
-if not(result==0):
-   raise Exception("ExoprtExGFX temp_analyze.sfc failed")
+run_lm("ExoprtGFX temp_analyze.sfc failed", "-ExportGFX", "temp_analyze.sfc")
+
+run_lm("ExoprtExGFX temp_analyze.sfc failed", "-ExportExGFX", "temp_analyze.sfc")
 
 os.remove("temp.map16")
-result = os.system("timeout 3 wine ../lm361/lm361.exe -ExportAllMap16 temp_analyze.sfc temp.map16")
-if not(result==0):
-   raise Exception("ExoprtAllMap16 temp_analyze.sfc failed")
-
-result = os.system("timeout 3 wine ../lm361/lm361.exe -ImportAllMap16 temp.sfc temp.map16")
-if not(result==0):
-   raise Exception("ImportMap16 failed")
-
-result = os.system("timeout 3 wine ../lm361/lm361.exe -ExportSharedPalette temp_analyze.sfc temp.smwpal")
-if not(result==0):
-   raise Exception("ExoprtSharedPalette Failed")
-
-result = os.system("timeout 3 wine ../lm361/lm361.exe -ImportSharedPalette temp.sfc temp.smwpal")
-if not(result==0):
-   raise Exception("ImportSharedPalette Failed")
-
-result = os.system("timeout 3 wine ../lm361/lm361.exe -ImportAllGraphics temp.sfc")
-if not(result==0):
-   raise Exception("ImportAllGraphics Failed")
-
-result = os.system("timeout 3 wine ../lm361/lm361.exe -TransferLevelGlobalExAnim temp.sfc temp_analyze.sfc")
-if not(result==0):
-   raise Exception("TransferLevelGlobalExAnim Failed")
-
-print("timeout 4 wine ../lm361/lm361.exe -TransferOverworld temp_lm361.sfc temp_analyze.sfc")
-result = os.system('timeout 4 wine ../lm361/lm361.exe -TransferOverworld temp_lm361.sfc temp_analyze.sfc')
-if not(result==0):
-   raise Exception("TransferOverWorld Failed")
-
-result = os.system('timeout 4 wine ../lm361/lm361.exe -ExportMultLevels temp_analyze.sfc MWL 1')
-if not(result==0):
-   raise Exception("ExoprtMultLevels Failed")
-result = os.system('timeout 4 wine ../lm361/lm361.exe -ImportMultLevels temp_lm361.sfc "./"')
-if not(result==0):
-   raise Exception("ImportMultLevels Failed")
-
-for f in glob.glob("MWL*.mwl"):
-      result = re.match("^MWL ([^.]+)\.mwl$", f)
+run_lm("ExoprtAllMap16 temp_analyze.sfc failed", "-ExportAllMap16", "temp_analyze.sfc", "temp.map16")
+
+run_lm("ImportMap16 failed", "-ImportAllMap16", "temp.sfc", "temp.map16")
+
+run_lm("ExoprtSharedPalette Failed", "-ExportSharedPalette", "temp_analyze.sfc", "temp.smwpal")
+
+run_lm("ImportSharedPalette Failed", "-ImportSharedPalette", "temp.sfc", "temp.smwpal")
+
+run_lm("ImportAllGraphics Failed", "-ImportAllGraphics", "temp.sfc")
+
+run_lm("TransferLevelGlobalExAnim Failed", "-TransferLevelGlobalExAnim", "temp.sfc", "temp_analyze.sfc")
+
+print("wine ../lm361/lm361.exe -TransferOverworld temp_lm361.sfc temp_analyze.sfc")
+run_lm("TransferOverWorld Failed", "-TransferOverworld", "temp_lm361.sfc", "temp_analyze.sfc", timeout=4)
+
+run_lm("ExoprtMultLevels Failed", "-ExportMultLevels", "temp_analyze.sfc", "MWL", "1", timeout=4)
+run_lm("ImportMultLevels Failed", "-ImportMultLevels", "temp_lm361.sfc", "./", timeout=4)
+
+for f in glob.iglob("MWL*.mwl"):
+      result = _MWL_RE.match(f)
       if result:
           mgroup = result.groups(0)[0]
           levelset.append(normalize_lid(mgroup))
 os.chdir(orig_path)
 if (gametag):
-    shutil.copy("temp/temp_lm361.sfc", "temp_lm361_" + str(gametag) + ".sfc")
+    clone_file("temp/temp_lm361.sfc", "temp_lm361_" + str(gametag) + ".sfc")
 #args.romfile = 'temp/temp_lm361.sfc'
 
-dict = {
-        "levels": levelset
-}
-
+# extract_all_levels2.sh builds temp/temp.json around this run: it writes the
+# opening brace before calling us and the version/level names after, so
+# append just the "levels" member
 with open('temp/temp.json', 'a') as file:
-    file.write( "\"levels\": " + json.dumps(dict["levels"]) + ",\n")
+    file.write(f'"levels": {json.dumps(levelset)},\n')
 
 
 
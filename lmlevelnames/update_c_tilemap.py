@@ -9,7 +9,7 @@ This regenerates default_tile_map.h in the same directory.
 """
 
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 # Hardcoded tile -> glyph mapping copied from q.py
@@ -71,9 +71,14 @@ def _c_char_literal(byte_val: int) -> str:
     return '0'
 
 
+# Rendered C literals for every byte value, so formatting a table is just lookups
+_C_CHAR_LITERALS = tuple(_c_char_literal(v) for v in range(256))
+_C_HEX_LITERALS = tuple(f"0x{v:02X}" for v in range(256))
+
+
 def build_tables():
-    # Forward: 256 entries default 0 (unmapped)
-    forward = [0] * 256
+    # Forward: 256 entries default 0 (unmapped); bytearrays match the C uint8_t tables
+    forward = bytearray(256)
     for tile, glyph in DEFAULT_TILE_MAP.items():
         if isinstance(glyph, str) and len(glyph) == 1:
             forward[tile] = ord(glyph)
@@ -82,7 +87,7 @@ def build_tables():
             forward[tile] = 0
 
     # Reverse: ASCII -> first tile code (0xFF if absent)
-    reverse = [0xFF] * 256
+    reverse = bytearray(b'\xff' * 256)
     for tile_code in range(256):
         ascii_byte = forward[tile_code]
         if ascii_byte != 0 and reverse[ascii_byte] == 0xFF:
@@ -92,58 +97,97 @@ def build_tables():
 
 
 def format_array_16_per_row(values, formatter, start_label_hex: int) -> str:
+    formatted = [formatter(v) for v in values]
     lines = []
-    for i in range(0, 256, 16):
-        row = values[i:i + 16]
+    for i in range(0, len(formatted), 16):
         label = f"/* 0x{(start_label_hex + i):02X}-0x{(start_label_hex + i + 15):02X} */"
-        rendered = ",".join(formatter(v) for v in row)
+        rendered = ",".join(formatted[i:i + 16])
         lines.append(f"    {label} {rendered},")
     return "\n".join(lines)
 
 
 def generate_header(forward, reverse) -> str:
-    timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%SZ')
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%SZ')
     forward_rows = format_array_16_per_row(
         forward,
-        lambda v: _c_char_literal(v) if v != 0 else '0',
+        _C_CHAR_LITERALS.__getitem__,
         0x00,
     )
     reverse_rows = format_array_16_per_row(
         reverse,
-        lambda v: f"0x{v:02X}",
+        _C_HEX_LITERALS.__getitem__,
         0x00,
     )
-    return (
-        "// Auto-generated from update_c_tilemap.py\n"
-        f"// Generated: {timestamp}\n"
-        "// Forward: TILE_TO_ASCII[0x00..0xFF] -> ASCII byte (0 if unmapped)\n"
-        "// Reverse: ASCII_TO_TILE[0x00..0xFF] -> preferred tile code (0xFF if unmapped)\n"
-        "// Note: Multiple tile codes may map to the same ASCII; reverse table picks the first.\n\n"
-        "#ifndef DEFAULT_TILE_MAP_H\n"
-        "#define DEFAULT_TILE_MAP_H\n\n"
-        "#include <stdint.h>\n\n"
-        "static const uint8_t TILE_TO_ASCII[256] = {\n"
-        f"{forward_rows}\n"
-        "};\n\n"
-        "static const uint8_t ASCII_TO_TILE[256] = {\n"
-        f"{reverse_rows}\n"
-        "};\n\n"
-        "static inline uint8_t tile_to_ascii_byte(uint8_t tileCode) {\n"
-        "    return TILE_TO_ASCII[tileCode];\n"
-        "}\n\n"
-        "static inline uint8_t ascii_byte_to_tile(uint8_t asciiByte) {\n"
-        "    return ASCII_TO_TILE[asciiByte];\n"
-        "}\n\n"
-        "#endif // DEFAULT_TILE_MAP_H\n"
-    )
+    parts = [
+        "// Auto-generated from update_c_tilemap.py",
+        f"// Generated: {timestamp}",
+        "// Forward: TILE_TO_ASCII[0x00..0xFF] -> ASCII byte (0 if unmapped)",
+        "// Reverse: ASCII_TO_TILE[0x00..0xFF] -> preferred tile code (0xFF if unmapped)",
+        "// Note: Multiple tile codes may map to the same ASCII; reverse table picks the first.",
+        "// Both tables are halves of one 64-byte aligned 512-byte array: TILE_MAP[tile] is the",
+        "// forward lookup and TILE_MAP[256 + ascii] the reverse, with no branching in callers.",
+        "",
+        "#ifndef DEFAULT_TILE_MAP_H",
+        "#define DEFAULT_TILE_MAP_H",
+        "",
+        "#include <stdint.h>",
+        "",
+        "#if defined(_MSC_VER)",
+        "#define TILE_MAP_ALIGN __declspec(align(64))",
+        "#elif defined(__GNUC__)",
+        "#define TILE_MAP_ALIGN __attribute__((aligned(64)))",
+        "#else",
+        "#define TILE_MAP_ALIGN",
+        "#endif",
+        "",
+        "static TILE_MAP_ALIGN const uint8_t TILE_MAP[512] = {",
+        "    /* TILE_TO_ASCII: TILE_MAP[0x000..0x0FF] */",
+        forward_rows,
+        "    /* ASCII_TO_TILE: TILE_MAP[0x100..0x1FF] */",
+        reverse_rows,
+        "};",
+        "",
+        "#define TILE_TO_ASCII (TILE_MAP)",
+        "#define ASCII_TO_TILE (TILE_MAP + 256)",
+        "",
+        "static inline uint8_t tile_to_ascii_byte(uint8_t tileCode) {",
+        "    return TILE_TO_ASCII[tileCode];",
+        "}",
+        "",
+        "static inline uint8_t ascii_byte_to_tile(uint8_t asciiByte) {",
+        "    return ASCII_TO_TILE[asciiByte];",
+        "}",
+        "",
+        "#endif // DEFAULT_TILE_MAP_H",
+        "",
+    ]
+    return "\n".join(parts)
+
+
+def _without_timestamp(header: str) -> str:
+    """Drop the '// Generated:' line so headers can be compared by content."""
+    return ''.join(line for line in header.splitlines(keepends=True)
+                   if not line.startswith('// Generated:'))
 
 
 def main():
     forward, reverse = build_tables()
     header = generate_header(forward, reverse)
     out_path = Path(__file__).with_name('default_tile_map.h')
-    out_path.write_text(header, encoding='utf-8')
-    print(f"Wrote {out_path.name} ({len(header)} bytes)")
+
+    # Leave the file (and its mtime) alone if only the timestamp would change,
+    # so C code including it is not rebuilt for nothing
+    try:
+        existing = out_path.read_bytes().decode('utf-8')
+    except FileNotFoundError:
+        existing = None
+    if existing is not None and _without_timestamp(existing) == _without_timestamp(header):
+        print(f"{out_path.name} up to date")
+        return
+
+    data = header.encode('utf-8')
+    out_path.write_bytes(data)
+    print(f"Wrote {out_path.name} ({len(data)} bytes)")
 
 
 if __name__ == '__main__':
@@ -5,7 +5,23 @@ Dynamic injection of graphics, palettes, and other assets
 into SNES memory (VRAM, CGRAM, etc.)
 """
 
+import hashlib
 import logging
+import struct
+
+# Relative when imported as py2snes.asset_injector, absolute when py2snes/
+# itself is on sys.path
+try:
+    from .bgr555 import BLUE_BITS, GREEN_BITS, RED_BITS, bgr555_to_rgb888, rgb888_to_bgr555
+    from .tile_codec import encode_planar
+except ImportError:
+    from bgr555 import BLUE_BITS, GREEN_BITS, RED_BITS, bgr555_to_rgb888, rgb888_to_bgr555
+    from tile_codec import encode_planar
+
+logger = logging.getLogger(__name__)
+
+# A palette is 16 little-endian BGR555 colors
+_PALETTE_STRUCT = struct.Struct('<16H')
 
 # SNES PPU Memory Addresses
 class PPU_ADDRESSES:
@@ -31,6 +47,30 @@ class SMW_PALETTE_RAM:
     BG_PALETTES = 0x7E0703   # Background palettes
     SPR_PALETTES = 0x7E0743  # Sprite palettes
 
+# RAM address of each palette number: 0-7 background, 8-15 sprite
+_PAL_ADDR = (tuple(SMW_PALETTE_RAM.BG_PALETTES + n * 32 for n in range(8)) +
+             tuple(SMW_PALETTE_RAM.SPR_PALETTES + n * 32 for n in range(8)))
+
+# Colors of create_rainbow_palette, packed once at import
+_RAINBOW_PALETTE = rgb888_to_bgr555(bytes([
+    0, 0, 0,        # Black
+    255, 0, 0,      # Red
+    255, 127, 0,    # Orange
+    255, 255, 0,    # Yellow
+    127, 255, 0,    # Lime
+    0, 255, 0,      # Green
+    0, 255, 127,    # Teal
+    0, 255, 255,    # Cyan
+    0, 127, 255,    # Sky blue
+    0, 0, 255,      # Blue
+    127, 0, 255,    # Purple
+    255, 0, 255,    # Magenta
+    255, 0, 127,    # Pink
+    255, 255, 255,  # White
+    127, 127, 127,  # Gray
+    64, 64, 64      # Dark gray
+]))
+
 class SNESAssetInjector:
     """SNES asset injection system"""
     
@@ -43,44 +83,78 @@ class SNESAssetInjector:
         self.PPU = PPU_ADDRESSES
         self.SMW_VRAM = SMW_VRAM
         self.SMW_PAL_RAM = SMW_PALETTE_RAM
+        
+        # Reused by modify_palette_colors for every edit
+        self._pal_scratch = bytearray(32)
+        
+        # What we last wrote to (or read from) each palette slot, and a digest
+        # of the last graphics staged, so unchanged re-injections are skipped
+        self._last_pal = [None] * 16
+        self._last_staged = None
+
+    def invalidate_cache(self):
+        """
+        Forget the cached palettes and staged graphics
+        
+        Call this when the game may have rewritten palette RAM or the staging
+        area itself (level load, reset), so the next injection is always sent
+        """
+        self._last_pal = [None] * 16
+        self._last_staged = None
 
     # ========================================
     # Graphics Injection (VRAM)
     # ========================================
 
-    async def inject_graphics(self, graphics_data, vram_address, format='4bpp'):
+    async def inject_graphics(self, graphics_data, vram_address, format='4bpp', force=False):
         """
         Upload graphics data to VRAM
         
+        The upload is skipped when the staging area already holds the same
+        data, unless force is set
+        
         Args:
-            graphics_data: Graphics data (raw tile data)
+            graphics_data: Graphics data (raw tile data; bytes, bytearray or
+                           memoryview, sent as-is without copying)
             vram_address: Target VRAM address
             format: Format ('2bpp', '4bpp', '8bpp')
+            force: Upload even if the data matches the last staged graphics
         
         Returns:
             Bytes written
         """
-        logging.info(f'[AssetInjector] Injecting {len(graphics_data)} bytes to VRAM 0x{vram_address:X} ({format})')
+        logger.info('[AssetInjector] Injecting %d bytes to VRAM 0x%X (%s)', len(graphics_data), vram_address, format)
         
         if vram_address < 0 or vram_address >= self.PPU.VRAM_SIZE:
             raise ValueError(f'Invalid VRAM address: 0x{vram_address:X}')
         
         # Upload to staging RAM
         staging_addr = 0x7F9000
-        await self.snes.PutAddress([[staging_addr, graphics_data]])
+        digest = hashlib.blake2b(graphics_data, digest_size=16).digest()
+        
+        if force or digest != self._last_staged:
+            # Only remember the data once it is known to be staged, so a
+            # failed write is retried by the next call
+            self._last_staged = None
+            if await self.snes.PutAddress([[staging_addr, graphics_data]]):
+                self._last_staged = digest
+        else:
+            logger.debug('  Graphics unchanged, staging RAM not rewritten')
         
-        logging.info(f'✓ Graphics staged at RAM 0x{staging_addr:X}')
-        logging.info(f'  (Game must DMA transfer to VRAM 0x{vram_address:X})')
+        logger.info('✓ Graphics staged at RAM 0x%X', staging_addr)
+        logger.info('  (Game must DMA transfer to VRAM 0x%X)', vram_address)
         
         return len(graphics_data)
 
-    async def inject_smw_tileset(self, tileset_data, slot):
+    async def inject_smw_tileset(self, tileset_data, slot, indexed=False):
         """
         Inject tileset for SMW
         
         Args:
             tileset_data: Tileset data
             slot: Slot ('sp1', 'sp2', 'sp3', 'sp4', 'fg', 'bg')
+            indexed: tileset_data is linear palette indices (64 bytes per
+                     tile) to encode to the slot's format first
         
         Returns:
             Bytes written
@@ -98,7 +172,10 @@ class SNESAssetInjector:
             raise ValueError(f'Invalid slot: {slot}')
         
         info = slot_map[slot]
-        logging.info(f'[AssetInjector] Injecting SMW {slot.upper()} tileset ({info["format"]})')
+        logger.info('[AssetInjector] Injecting SMW %s tileset (%s)', slot.upper(), info['format'])
+        
+        if indexed:
+            tileset_data = self.encode_tiles(tileset_data, info['format'])
         
         return await self.inject_graphics(tileset_data, info['addr'], info['format'])
 
@@ -118,11 +195,10 @@ class SNESAssetInjector:
         Returns:
             SNES color (16-bit BGR555)
         """
-        r5 = r // 8  # 8-bit to 5-bit
-        g5 = g // 8
-        b5 = b // 8
-        
-        return (b5 << 10) | (g5 << 5) | r5
+        # The channel tables only cover 0-255; catches negatives too
+        if (r | g | b) & ~0xFF:
+            raise ValueError(f'Invalid RGB color: ({r}, {g}, {b}) (channels must be 0-255)')
+        return BLUE_BITS[b] | GREEN_BITS[g] | RED_BITS[r]
 
     def snes_to_rgb(self, snes_color):
         """
@@ -157,24 +233,23 @@ class SNESAssetInjector:
         if len(colors) > 16:
             raise ValueError('Palette can have max 16 colors')
         
-        palette_bytes = bytearray(32)
-        
-        for i, color in enumerate(colors):
-            snes_color = self.rgb_to_snes(color['r'], color['g'], color['b'])
-            
-            # Write as little-endian 16-bit
-            palette_bytes[i * 2] = snes_color & 0xFF
-            palette_bytes[i * 2 + 1] = (snes_color >> 8) & 0xFF
+        rgb = bytes(value for color in colors for value in (color['r'], color['g'], color['b']))
+        palette = rgb888_to_bgr555(rgb)
         
-        return bytes(palette_bytes)
+        return palette + bytes(32 - len(palette))  # unused entries stay black
 
-    async def inject_smw_palette(self, palette_data, palette_num):
+    async def inject_smw_palette(self, palette_data, palette_num, force=False):
         """
         Inject palette to SMW palette RAM
         
+        The write is skipped when the slot already holds the same colors
+        (as last written or read through this injector), unless force is set
+        
         Args:
-            palette_data: Palette data (32 bytes = 16 colors)
+            palette_data: Palette data (32 bytes = 16 colors; any bytes-like
+                          object, sent as-is without copying)
             palette_num: Palette number (0-7 for BG, 8-15 for sprites)
+            force: Write even if the data matches the cached palette
         """
         if len(palette_data) != 32:
             raise ValueError(f'Invalid palette size: {len(palette_data)} bytes (expected 32)')
@@ -182,18 +257,23 @@ class SNESAssetInjector:
         if not 0 <= palette_num <= 15:
             raise ValueError(f'Invalid palette number: {palette_num} (must be 0-15)')
         
-        # Calculate address
-        if palette_num < 8:
-            base_addr = self.SMW_PAL_RAM.BG_PALETTES + (palette_num * 32)
-            logging.info(f'[AssetInjector] Injecting background palette {palette_num}')
-        else:
-            base_addr = self.SMW_PAL_RAM.SPR_PALETTES + ((palette_num - 8) * 32)
-            logging.info(f'[AssetInjector] Injecting sprite palette {palette_num - 8}')
+        base_addr = _PAL_ADDR[palette_num]
+        logger.info('[AssetInjector] Injecting %s palette %s',
+                    'background' if palette_num < 8 else 'sprite', palette_num % 8)
+        
+        if not force and self._last_pal[palette_num] == palette_data:
+            logger.info('✓ Palette unchanged, nothing to write')
+            return
         
-        # Write to RAM
-        await self.snes.PutAddress([[base_addr, palette_data]])
+        # Write to RAM. The slot is unknown until the write completes, and
+        # stays unknown if it fails
+        self._last_pal[palette_num] = None
+        if not await self.snes.PutAddress([[base_addr, palette_data]]):
+            logger.error('[AssetInjector] Palette %s write failed', palette_num)
+            return
+        self._last_pal[palette_num] = bytes(palette_data)
         
-        logging.info('✓ Palette injected to RAM')
+        logger.info('✓ Palette injected to RAM')
 
     async def read_smw_palette(self, palette_num):
         """
@@ -203,17 +283,34 @@ class SNESAssetInjector:
             palette_num: Palette number (0-15)
         
         Returns:
-            Palette data (32 bytes)
+            Palette data (32 bytes), or None if the read failed
         """
         if not 0 <= palette_num <= 15:
             raise ValueError(f'Invalid palette number: {palette_num}')
         
-        if palette_num < 8:
-            base_addr = self.SMW_PAL_RAM.BG_PALETTES + (palette_num * 32)
-        else:
-            base_addr = self.SMW_PAL_RAM.SPR_PALETTES + ((palette_num - 8) * 32)
+        palette_data = await self.snes.GetAddress(_PAL_ADDR[palette_num], 32)
+        if palette_data is None:
+            return None
+        self._last_pal[palette_num] = bytes(palette_data)
         
-        return await self.snes.GetAddress(base_addr, 32)
+        return palette_data
+
+    def parse_palette_channels(self, palette_data):
+        """
+        Parse palette data to one sequence per color channel
+        
+        Args:
+            palette_data: Palette data (32 bytes)
+        
+        Returns:
+            Tuple of (reds, greens, blues), each 16 bytes (0-255 each)
+        """
+        if len(palette_data) < 32:
+            raise ValueError(f'Invalid palette size: {len(palette_data)} bytes (expected 32)')
+        
+        rgb = bgr555_to_rgb888(palette_data[:32])
+        
+        return rgb[0::3], rgb[1::3], rgb[2::3]
 
     def parse_palette(self, palette_data):
         """
@@ -225,13 +322,9 @@ class SNESAssetInjector:
         Returns:
             List of 16 RGB color dicts
         """
-        colors = []
+        reds, greens, blues = self.parse_palette_channels(palette_data)
         
-        for i in range(16):
-            snes_color = palette_data[i * 2] | (palette_data[i * 2 + 1] << 8)
-            colors.append(self.snes_to_rgb(snes_color))
-        
-        return colors
+        return [{'r': r, 'g': g, 'b': b} for r, g, b in zip(reds, greens, blues)]
 
     async def modify_palette_colors(self, palette_num, color_map):
         """
@@ -241,28 +334,132 @@ class SNESAssetInjector:
             palette_num: Palette number (0-15)
             color_map: Dict of color index to RGB: {0: {'r': 255, 'g': 0, 'b': 0}}
         """
-        logging.info(f'[AssetInjector] Modifying palette {palette_num}...')
-        
-        # Read current palette
-        current_palette = await self.read_smw_palette(palette_num)
-        new_palette = bytearray(current_palette)
+        indices = []
+        rgb = bytearray()
         
-        # Modify specified colors
-        for color_index, rgb in color_map.items():
+        for color_index, color in color_map.items():
             idx = int(color_index)
+            if 0 <= idx <= 15:
+                indices.append(idx)
+                rgb += bytes((color['r'], color['g'], color['b']))
+        
+        await self.modify_palette_colors_rgb(palette_num, indices, rgb)
+
+    async def modify_palette_colors_rgb(self, palette_num, indices, rgb):
+        """
+        Modify specific colors in a palette, given as flat RGB data
+        
+        Args:
+            palette_num: Palette number (0-15)
+            indices: Color indices to replace (0-15 each)
+            rgb: Bytes-like R, G, B triples, one per index (flat or one row
+                 per color)
+        """
+        rgb = memoryview(rgb).cast('B')
+        
+        if len(rgb) != len(indices) * 3:
+            raise ValueError(f'Expected {len(indices) * 3} bytes of RGB data, got {len(rgb)}')
+        
+        for idx in indices:
             if not 0 <= idx <= 15:
-                continue
-            
-            snes_color = self.rgb_to_snes(rgb['r'], rgb['g'], rgb['b'])
-            new_palette[idx * 2] = snes_color & 0xFF
-            new_palette[idx * 2 + 1] = (snes_color >> 8) & 0xFF
-            
-            logging.info(f'  Color {idx}: RGB({rgb["r"]}, {rgb["g"]}, {rgb["b"]}) → SNES(0x{snes_color:04X})')
-        
-        # Write modified palette
+                raise ValueError(f'Invalid color index: {idx} (must be 0-15)')
+        
+        logger.info('[AssetInjector] Modifying palette %s...', palette_num)
+        
+        # Pack every new color in one pass
+        packed = rgb888_to_bgr555(rgb)
+        
+        # Read current palette into the scratch buffer
+        current_palette = await self.read_smw_palette(palette_num)
+        if current_palette is None:
+            logger.error('[AssetInjector] Could not read palette %s to modify', palette_num)
+            return
+        new_palette = self._pal_scratch
+        new_palette[:] = current_palette
+        
+        # Both sides are little-endian colors, so copying native 16-bit
+        # elements between them is byte order independent
+        colors = memoryview(new_palette).cast('H')
+        new_colors = memoryview(packed).cast('H')
+        
+        for i, idx in enumerate(indices):
+            colors[idx] = new_colors[i]
+        
+        colors.release()
+        
+        if logger.isEnabledFor(logging.INFO):
+            for i, idx in enumerate(indices):
+                r, g, b = rgb[i * 3:i * 3 + 3]
+                logger.info('  Color %d: RGB(%s, %s, %s) → SNES(0x%04X)', idx, r, g, b,
+                            packed[i * 2] | packed[i * 2 + 1] << 8)
+        
+        # Write modified palette. Send a snapshot: another edit may refill the
+        # scratch buffer while this write waits for the connection
         await self.inject_smw_palette(bytes(new_palette), palette_num)
         
-        logging.info('✓ Palette colors modified')
+        logger.info('✓ Palette colors modified')
+
+    async def modify_palettes(self, changes):
+        """
+        Modify colors in several palettes with one read and one write
+
+        Only the span from the first to the last changed color of each
+        palette is read back and rewritten, so the console sees a single
+        GetAddress and a single PutAddress request however many colors change
+
+        Args:
+            changes: Dict of palette number to color map:
+                     {0: {1: {'r': 255, 'g': 0, 'b': 0}}, 9: {3: {...}}}
+
+        Returns:
+            False if the current colors could not be read, otherwise the
+            result of the PutAddress write
+        """
+        logger.info('[AssetInjector] Modifying %d palettes...', len(changes))
+
+        spans = []
+        span_colors = []
+
+        for palette_num, color_map in changes.items():
+            if not 0 <= palette_num <= 15:
+                raise ValueError(f'Invalid palette number: {palette_num} (must be 0-15)')
+
+            colors = {}
+            for color_index, rgb in color_map.items():
+                idx = int(color_index)
+                if 0 <= idx <= 15:
+                    colors[idx] = self.rgb_to_snes(rgb['r'], rgb['g'], rgb['b'])
+
+            if not colors:
+                continue
+
+            # Only part of the slot is rewritten below
+            self._last_pal[palette_num] = None
+
+            first = min(colors)
+            spans.append((_PAL_ADDR[palette_num] + first * 2, (max(colors) - first + 1) * 2))
+            span_colors.append({(idx - first) * 2: color for idx, color in colors.items()})
+
+        if not spans:
+            return True
+
+        # Read every dirty span in one round trip
+        current = await self.snes.GetAddresses(spans)
+        if current is None:
+            logger.error('[AssetInjector] Could not read palettes to modify')
+            return False
+
+        writes = []
+        for (address, size), data, colors in zip(spans, current, span_colors):
+            span = bytearray(data)
+            for offset, color in colors.items():
+                struct.pack_into('<H', span, offset, color)
+            writes.append([address, span])
+
+        result = await self.snes.PutAddress(writes)
+
+        logger.info('✓ Modified %d colors in %d palettes', sum(len(colors) for colors in span_colors), len(writes))
+        return result
 
     # ========================================
     # Asset File Loading
@@ -270,23 +467,23 @@ class SNESAssetInjector:
 
     async def load_and_inject_graphics(self, graphics_path, vram_address, format='4bpp'):
         """Load graphics file from SD card and inject"""
-        logging.info(f'[AssetInjector] Loading graphics from {graphics_path}...')
+        logger.info('[AssetInjector] Loading graphics from %s...', graphics_path)
         
         graphics_data = await self.snes.GetFile(graphics_path)
-        logging.info(f'  ✓ Loaded {len(graphics_data)} bytes')
+        logger.info('  ✓ Loaded %d bytes', len(graphics_data))
         
         return await self.inject_graphics(graphics_data, vram_address, format)
 
     async def load_and_inject_palette(self, palette_path, palette_num):
         """Load palette file from SD card and inject"""
-        logging.info(f'[AssetInjector] Loading palette from {palette_path}...')
+        logger.info('[AssetInjector] Loading palette from %s...', palette_path)
         
         palette_data = await self.snes.GetFile(palette_path)
         
         if len(palette_data) != 32:
             raise ValueError(f'Invalid palette file size: {len(palette_data)} bytes (expected 32)')
         
-        logging.info('  ✓ Loaded 16-color palette')
+        logger.info('  ✓ Loaded 16-color palette')
         
         return await self.inject_smw_palette(palette_data, palette_num)
 
@@ -296,36 +493,19 @@ class SNESAssetInjector:
 
     def create_grayscale_palette(self, num_colors=16):
         """Create grayscale palette"""
-        colors = []
+        if num_colors > 16:
+            raise ValueError('Palette can have max 16 colors')
         
-        for i in range(num_colors):
-            value = int((i / (num_colors - 1)) * 255)
-            colors.append({'r': value, 'g': value, 'b': value})
+        levels = bytes(int((i / (num_colors - 1)) * 255) for i in range(num_colors))
+        rgb = bytearray(num_colors * 3)
+        rgb[0::3] = rgb[1::3] = rgb[2::3] = levels
+        palette = rgb888_to_bgr555(rgb)
         
-        return self.create_palette(colors)
+        return palette + bytes(32 - len(palette))  # unused entries stay black
 
     def create_rainbow_palette(self):
         """Create rainbow palette"""
-        colors = [
-            {'r': 0, 'g': 0, 'b': 0},       # Black
-            {'r': 255, 'g': 0, 'b': 0},     # Red
-            {'r': 255, 'g': 127, 'b': 0},   # Orange
-            {'r': 255, 'g': 255, 'b': 0},   # Yellow
-            {'r': 127, 'g': 255, 'b': 0},   # Lime
-            {'r': 0, 'g': 255, 'b': 0},     # Green
-            {'r': 0, 'g': 255, 'b': 127},   # Teal
-            {'r': 0, 'g': 255, 'b': 255},   # Cyan
-            {'r': 0, 'g': 127, 'b': 255},   # Sky blue
-            {'r': 0, 'g': 0, 'b': 255},     # Blue
-            {'r': 127, 'g': 0, 'b': 255},   # Purple
-            {'r': 255, 'g': 0, 'b': 255},   # Magenta
-            {'r': 255, 'g': 0, 'b': 127},   # Pink
-            {'r': 255, 'g': 255, 'b': 255}, # White
-            {'r': 127, 'g': 127, 'b': 127}, # Gray
-            {'r': 64, 'g': 64, 'b': 64}     # Dark gray
-        ]
-        
-        return self.create_palette(colors)
+        return _RAINBOW_PALETTE
 
     def adjust_palette_brightness(self, palette_data, factor):
         """
@@ -338,17 +518,17 @@ class SNESAssetInjector:
         Returns:
             Modified palette
         """
-        colors = self.parse_palette(palette_data)
-        adjusted_colors = []
-        
-        for color in colors:
-            adjusted_colors.append({
-                'r': min(255, int(color['r'] * factor)),
-                'g': min(255, int(color['g'] * factor)),
-                'b': min(255, int(color['b'] * factor))
-            })
+        # Adjusted 5-bit level for each of the 32 possible channel levels,
+        # so each color is three lookups instead of three multiplies. Scaling
+        # the 5-bit level directly truncates exactly like going through 8 bits
+        levels = tuple(max(0, min(31, int(level * factor))) for level in range(32))
+        
+        adjusted = [
+            (levels[(color >> 10) & 0x1F] << 10) | (levels[(color >> 5) & 0x1F] << 5) | levels[color & 0x1F]
+            for color in _PALETTE_STRUCT.unpack_from(palette_data)
+        ]
         
-        return self.create_palette(adjusted_colors)
+        return _PALETTE_STRUCT.pack(*adjusted)
 
     # ========================================
     # Tileset Utilities
@@ -365,6 +545,19 @@ class SNESAssetInjector:
         else:
             raise ValueError(f'Unknown format: {format}')
 
+    def encode_tiles(self, pixels, format):
+        """
+        Encode linear tiles to SNES planar format
+        
+        Args:
+            pixels: Palette indices, 64 bytes per 8×8 tile
+            format: Format ('2bpp', '4bpp', '8bpp')
+        
+        Returns:
+            Encoded tile data
+        """
+        return encode_planar(pixels, self.get_tile_size(format) // 8)
+
     def get_tile_count(self, graphics_data, format):
         """Calculate number of tiles in graphics data"""
         tile_size = self.get_tile_size(format)
@@ -0,0 +1,70 @@
+"""
+BGR555 Color Conversion
+
+Bulk conversion between RGB888 pixel data and the SNES 15-bit BGR555
+color format, for whole images as well as palettes
+"""
+
+import sys
+from array import array
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+# Each 8-bit channel value reduced to 5 bits and shifted into its BGR555
+# position, so packing a color is three lookups and two ORs. Indexed by
+# 0-255 only; callers with unchecked channel values must validate them.
+RED_BITS = tuple(v >> 3 for v in range(256))
+GREEN_BITS = tuple(v << 5 for v in RED_BITS)
+BLUE_BITS = tuple(v << 10 for v in RED_BITS)
+
+def rgb888_to_bgr555(rgb):
+    """
+    Convert RGB888 pixels to BGR555
+
+    Args:
+        rgb: Bytes-like R, G, B triples (3 bytes per pixel, any image flattened)
+
+    Returns:
+        Little-endian BGR555 colors (bytes, 2 per pixel)
+    """
+    if len(rgb) % 3:
+        raise ValueError(f'RGB data is not a whole number of pixels ({len(rgb)} bytes)')
+
+    # Split the channels with C-level slicing before the one Python-level pass
+    rgb = memoryview(rgb).cast('B')
+    colors = array('H', [
+        BLUE_BITS[b] | GREEN_BITS[g] | RED_BITS[r]
+        for r, g, b in zip(rgb[0::3], rgb[1::3], rgb[2::3])
+    ])
+
+    if _BIG_ENDIAN:
+        colors.byteswap()
+
+    return colors.tobytes()
+
+def bgr555_to_rgb888(data):
+    """
+    Convert BGR555 colors to RGB888
+
+    Args:
+        data: Little-endian BGR555 colors (2 bytes each)
+
+    Returns:
+        R, G, B triples (bytes, 3 per color, 0-248 per channel)
+    """
+    if len(data) % 2:
+        raise ValueError(f'BGR555 data has an odd length ({len(data)} bytes)')
+
+    colors = array('H')
+    colors.frombytes(data)
+
+    if _BIG_ENDIAN:
+        colors.byteswap()
+
+    # Fill each channel with one extended-slice assignment
+    rgb = bytearray(len(colors) * 3)
+    rgb[0::3] = bytes((color & 0x1F) << 3 for color in colors)
+    rgb[1::3] = bytes(((color >> 5) & 0x1F) << 3 for color in colors)
+    rgb[2::3] = bytes(((color >> 10) & 0x1F) << 3 for color in colors)
+
+    return bytes(rgb)
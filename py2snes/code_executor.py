@@ -16,8 +16,100 @@ CMD_SPACE_SIZE = 0x400  # 1KB available
 FREE_RAM_START = 0x7F8000
 FREE_RAM_SIZE = 0x8000  # 32KB available
 
+# Byte snippets run by execute_snippet set to 1 when they finish
+DONE_FLAG_ADDR = 0x7F8FFE
+
+# usb2snes maps SNES WRAM ($7E0000-$7FFFFF) to 0xF50000; the flag is read
+# and cleared through that window, while the snippets store to DONE_FLAG_ADDR
+WRAM_START = 0xF50000
+_DONE_FLAG_WRAM = WRAM_START + DONE_FLAG_ADDR - 0x7E0000
+
 import asyncio
 import logging
+import re
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Instructions assemble_instruction understands
+_LDA_IMM = re.compile(r'^LDA #\$([0-9A-F]{2})$')   # LDA #$xx
+_STA_ABS = re.compile(r'^STA \$([0-9A-F]{4})$')    # STA $xxxx
+_IMPLIED = {
+    'RTS': bytes([0x60]),
+    'RTL': bytes([0x6B]),
+    'NOP': bytes([0xEA]),
+}
+
+# Opcode -> (mnemonic, operand bytes, text) for disassemble; None if unknown
+_OPCODES = [None] * 256
+_OPCODES[0xA9] = ('LDA', 1, 'LDA #${:02X}')
+_OPCODES[0x8D] = ('STA', 2, 'STA ${:04X}')
+_OPCODES[0x60] = ('RTS', 0, 'RTS')
+_OPCODES[0x6B] = ('RTL', 0, 'RTL')
+_OPCODES[0xEA] = ('NOP', 0, 'NOP')
+_OPCODES = tuple(_OPCODES)
+
+# Packers for the assembly templates: opcodes as B, 16-bit operands as <H
+_PACK_WRITE_BYTE = struct.Struct('<BBBHB').pack
+_PACK_WRITE_WORD = struct.Struct('<BBBHBHBBB').pack
+_PACK_ADD_TO_ADDRESS = struct.Struct('<BHBBBBHB').pack
+_PACK_CONDITIONAL_WRITE = struct.Struct('<BHBBBBBBBHB').pack
+_PACK_WORD_INTO = struct.Struct('<H').pack_into
+
+# Appended to every snippet: LDA #$01 / STA.l DONE_FLAG_ADDR / RTS
+_DONE_TAIL = bytes([0xA9, 0x01, 0x8F]) + DONE_FLAG_ADDR.to_bytes(3, 'little') + bytes([0x60])
+
+def _branch_offset(branch_at, target):
+    """Relative displacement for a 2-byte branch at branch_at that jumps to target"""
+    return (target - (branch_at + 2)) & 0xFF
+
+# Loop templates; operands are filled in with _PACK_WORD_INTO at the offsets below
+_COPY_TEMPLATE = bytearray([
+    0xA2, 0x00, 0x00,                         # LDX #$0000
+    # Loop (3):
+    0xBD, 0x00, 0x00,                         # LDA $srcAddr,X (4)
+    0x9D, 0x00, 0x00,                         # STA $dstAddr,X (7)
+    0xE8,                                     # INX
+    0xE0, 0x00, 0x00,                         # CPX #$length (11)
+    0xD0, 0x00,                               # BNE .loop (13)
+    0x60                                      # RTS
+])
+_COPY_TEMPLATE[14] = _branch_offset(13, 3)
+_COPY_TEMPLATE = bytes(_COPY_TEMPLATE)
+
+_FILL_TEMPLATE = bytearray([
+    0xA9, 0x00,                               # LDA #$value (1)
+    0xA2, 0x00, 0x00,                         # LDX #$0000
+    # Loop (5):
+    0x9D, 0x00, 0x00,                         # STA $address,X (6)
+    0xE8,                                     # INX
+    0xE0, 0x00, 0x00,                         # CPX #$length (10)
+    0xD0, 0x00,                               # BNE .loop (12)
+    0x60                                      # RTS
+])
+_FILL_TEMPLATE[13] = _branch_offset(12, 5)
+_FILL_TEMPLATE = bytes(_FILL_TEMPLATE)
+
+# Counts down instead, so no CPX is needed; stores to (address - 1) + X for X = length..1
+_FILL_DEX_TEMPLATE = bytearray([
+    0xA9, 0x00,                               # LDA #$value (1)
+    0xA2, 0x00, 0x00,                         # LDX #$length (3)
+    # Loop (5):
+    0x9D, 0x00, 0x00,                         # STA $address-1,X (6)
+    0xCA,                                     # DEX
+    0xD0, 0x00,                               # BNE .loop (9)
+    0x60                                      # RTS
+])
+_FILL_DEX_TEMPLATE[10] = _branch_offset(9, 5)
+_FILL_DEX_TEMPLATE = bytes(_FILL_DEX_TEMPLATE)
+
+# create_memory_fill_code picks the cheapest form for the length.
+# Cycles per byte filled (8-bit A, 16-bit X):
+#   unrolled   STA abs                          4   (3 bytes of code per byte)
+#   DEX loop   STA abs,X / DEX / BNE           10
+#   INX loop   STA abs,X / INX / CPX # / BNE   13   (only when address is $0000)
+_FILL_UNROLL_MAX = 8
+_PACK_STA_ABS = struct.Struct('<BH').pack
 
 class CodeExecutor:
     """Execute custom 65816 assembly code on SNES"""
@@ -33,47 +125,91 @@ class CodeExecutor:
     # CMD Space Execution (SD2SNES/FXPak Pro)
     # ========================================
 
-    async def execute_in_cmd_space(self, code, wait_for_return=False):
+    async def execute_in_cmd_space(self, code, wait_for_return=False, timeout=0.1):
         """
         Execute code in CMD space (SD2SNES/FXPak Pro only)
         
+        Nothing here triggers the uploaded code; it runs once a hijack (or
+        the user) calls into CMD space
+        
         Args:
             code: Assembly code bytes
-            wait_for_return: Wait for code to complete
+            wait_for_return: Wait for code to complete; only useful when
+                             something triggers it, and the code must set
+                             DONE_FLAG_ADDR to 1 when it finishes
+            timeout: Seconds to wait for completion
         
         Returns:
-            Success status (bool)
+            Success status (bool); False if the upload failed or, with
+            wait_for_return, the code did not signal completion within timeout
         """
         if len(code) > CMD_SPACE_SIZE:
             raise ValueError(f'Code too large for CMD space ({len(code)} > {CMD_SPACE_SIZE} bytes)')
 
-        logging.info(f'[CodeExecutor] Uploading {len(code)} bytes to CMD space...')
+        logger.info('[CodeExecutor] Uploading %d bytes to CMD space...', len(code))
         
-        # Upload code to CMD space
-        await self.snes.PutAddress([[CMD_SPACE_ADDR, code]])
+        # Upload code to CMD space, clearing the completion flag in the same request
+        writes = [[CMD_SPACE_ADDR, code]]
+        if wait_for_return:
+            writes.insert(0, [_DONE_FLAG_WRAM, bytes(1)])
+        if not await self.snes.PutAddress(writes):
+            logger.error('[CodeExecutor] CMD space upload failed')
+            return False
         
-        logging.info('[CodeExecutor] Code uploaded to CMD space (0x002C00)')
-        logging.info('[CodeExecutor] Trigger execution manually or via hijack')
+        logger.info('[CodeExecutor] Code uploaded to CMD space (0x002C00)')
+        logger.info('[CodeExecutor] Trigger execution manually or via hijack')
         
         if wait_for_return:
-            await asyncio.sleep(0.1)
+            return await self.wait_for_done(timeout)
         
         return True
 
-    async def execute_snippet(self, code):
+    async def wait_for_done(self, timeout=0.1):
+        """
+        Poll DONE_FLAG_ADDR until running code signals completion
+        
+        Polls right away, then backs off from 1ms up to 16ms between reads
+        
+        Args:
+            timeout: Seconds to wait before giving up
+        
+        Returns:
+            True if the flag was set within timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = 0.001
+        
+        while True:
+            flag = await self.snes.GetAddress(_DONE_FLAG_WRAM, 1)
+            if flag is None:
+                return False
+            if flag[0]:
+                return True
+            
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.016)
+
+    async def execute_snippet(self, code, wait_for_return=False, timeout=0.1):
         """
         Execute simple assembly snippet in CMD space
-        Automatically adds RTS (return) at the end
+        Automatically adds code to set DONE_FLAG_ADDR and RTS (return) at the end
         
         Args:
             code: Assembly code bytes (without RTS)
+            wait_for_return: Wait for the snippet to finish; pass True only
+                             when a hijack is in place to run CMD space
+            timeout: Seconds to wait for completion
         
         Returns:
-            Success status (bool)
+            Success status (bool); see execute_in_cmd_space()
         """
-        # Add RTS (0x60) at the end to return
-        full_code = code + bytes([0x60])
-        return await self.execute_in_cmd_space(full_code, True)
+        full_code = code + _DONE_TAIL
+        return await self.execute_in_cmd_space(full_code, wait_for_return, timeout)
 
     # ========================================
     # RAM Execution
@@ -93,11 +229,11 @@ class CodeExecutor:
         if len(code) > FREE_RAM_SIZE:
             raise ValueError(f'Code too large for free RAM ({len(code)} > {FREE_RAM_SIZE} bytes)')
 
-        logging.info(f'[CodeExecutor] Uploading {len(code)} bytes to RAM 0x{address:X}...')
+        logger.info('[CodeExecutor] Uploading %d bytes to RAM 0x%X...', len(code), address)
         
         await self.snes.PutAddress([[address, code]])
         
-        logging.info('[CodeExecutor] Code uploaded to RAM')
+        logger.info('[CodeExecutor] Code uploaded to RAM')
         return address
 
     async def execute_from_ram(self, address, method='jsl'):
@@ -111,8 +247,8 @@ class CodeExecutor:
         Returns:
             Success status (bool)
         """
-        logging.info(f'[CodeExecutor] Executing code at 0x{address:X} via {method.upper()}')
-        logging.info(f'[CodeExecutor] Setup hijack to execute code: {method.upper()} ${address:X}')
+        logger.info('[CodeExecutor] Executing code at 0x%X via %s', address, method.upper())
+        logger.info('[CodeExecutor] Setup hijack to execute code: %s $%X', method.upper(), address)
         
         return True
 
@@ -134,11 +270,11 @@ class CodeExecutor:
         # LDA #$value
         # STA $address
         # RTS
-        code = bytes([
+        code = _PACK_WRITE_BYTE(
             0xA9, value,                              # LDA #$value
-            0x8D, address & 0xFF, (address >> 8) & 0xFF,  # STA $address
+            0x8D, address & 0xFFFF,                   # STA $address
             0x60                                      # RTS
-        ])
+        )
         
         return code
 
@@ -158,13 +294,13 @@ class CodeExecutor:
         # STA $address
         # SEP #$20  ; Set A back to 8-bit
         # RTS
-        code = bytes([
+        code = _PACK_WRITE_WORD(
             0xC2, 0x20,                               # REP #$20 (16-bit A)
-            0xA9, value & 0xFF, (value >> 8) & 0xFF,  # LDA #$value
-            0x8D, address & 0xFF, (address >> 8) & 0xFF,  # STA $address
+            0xA9, value & 0xFFFF,                     # LDA #$value
+            0x8D, address & 0xFFFF,                   # STA $address
             0xE2, 0x20,                               # SEP #$20 (8-bit A)
             0x60                                      # RTS
-        ])
+        )
         
         return code
 
@@ -180,23 +316,20 @@ class CodeExecutor:
         Returns:
             Assembly code (bytes)
         """
-        code = bytes([
-            0xA2, 0x00, 0x00,                         # LDX #$0000
-            # Loop:
-            0xBD, src_addr & 0xFF, (src_addr >> 8) & 0xFF,  # LDA $srcAddr,X
-            0x9D, dst_addr & 0xFF, (dst_addr >> 8) & 0xFF,  # STA $dstAddr,X
-            0xE8,                                     # INX
-            0xE0, length & 0xFF, (length >> 8) & 0xFF,      # CPX #$length
-            0xD0, 0xF5,                               # BNE .loop (relative -11)
-            0x60                                      # RTS
-        ])
+        code = bytearray(_COPY_TEMPLATE)
+        _PACK_WORD_INTO(code, 4, src_addr & 0xFFFF)
+        _PACK_WORD_INTO(code, 7, dst_addr & 0xFFFF)
+        _PACK_WORD_INTO(code, 11, length & 0xFFFF)
         
-        return code
+        return bytes(code)
 
     def create_memory_fill_code(self, address, value, length):
         """
         Create assembly template for filling memory with a value
         
+        Fills of up to 8 bytes are unrolled into plain stores; longer fills
+        use a DEX/BNE loop (see the cycle table above _FILL_UNROLL_MAX)
+        
         Args:
             address: Start address
             value: Byte value to fill
@@ -205,18 +338,25 @@ class CodeExecutor:
         Returns:
             Assembly code (bytes)
         """
-        code = bytes([
-            0xA9, value,                              # LDA #$value
-            0xA2, 0x00, 0x00,                         # LDX #$0000
-            # Loop:
-            0x9D, address & 0xFF, (address >> 8) & 0xFF,    # STA $address,X
-            0xE8,                                     # INX
-            0xE0, length & 0xFF, (length >> 8) & 0xFF,      # CPX #$length
-            0xD0, 0xF7,                               # BNE .loop (relative -9)
-            0x60                                      # RTS
-        ])
+        address &= 0xFFFF
         
-        return code
+        if length <= _FILL_UNROLL_MAX and address + length <= 0x10000:
+            stores = b''.join(_PACK_STA_ABS(0x8D, address + i) for i in range(length))
+            return bytes([0xA9, value]) + stores + bytes([0x60])
+        
+        if address:
+            code = bytearray(_FILL_DEX_TEMPLATE)
+            code[1] = value
+            _PACK_WORD_INTO(code, 3, length & 0xFFFF)
+            _PACK_WORD_INTO(code, 6, address - 1)
+            return bytes(code)
+        
+        code = bytearray(_FILL_TEMPLATE)
+        code[1] = value
+        _PACK_WORD_INTO(code, 6, address)
+        _PACK_WORD_INTO(code, 10, length & 0xFFFF)
+        
+        return bytes(code)
 
     def create_add_to_address_code(self, address, value):
         """
@@ -229,13 +369,13 @@ class CodeExecutor:
         Returns:
             Assembly code (bytes)
         """
-        code = bytes([
-            0xAD, address & 0xFF, (address >> 8) & 0xFF,    # LDA $address
+        code = _PACK_ADD_TO_ADDRESS(
+            0xAD, address & 0xFFFF,                   # LDA $address
             0x18,                                     # CLC
             0x69, value,                              # ADC #$value
-            0x8D, address & 0xFF, (address >> 8) & 0xFF,    # STA $address
+            0x8D, address & 0xFFFF,                   # STA $address
             0x60                                      # RTS
-        ])
+        )
         
         return code
 
@@ -252,15 +392,15 @@ class CodeExecutor:
         Returns:
             Assembly code (bytes)
         """
-        code = bytes([
-            0xAD, cond_addr & 0xFF, (cond_addr >> 8) & 0xFF,        # LDA $condAddr
+        code = _PACK_CONDITIONAL_WRITE(
+            0xAD, cond_addr & 0xFFFF,                                 # LDA $condAddr
             0xC9, cond_value,                                         # CMP #$condValue
             0xD0, 0x05,                                               # BNE .skip (+5)
             0xA9, write_value,                                        # LDA #$writeValue
-            0x8D, write_addr & 0xFF, (write_addr >> 8) & 0xFF,      # STA $writeAddr
+            0x8D, write_addr & 0xFFFF,                                # STA $writeAddr
             # .skip:
             0x60                                                      # RTS
-        ])
+        )
         
         return code
 
@@ -268,20 +408,54 @@ class CodeExecutor:
     # High-Level Helpers
     # ========================================
 
-    async def execute_write(self, address, value):
+    async def execute_write(self, address, value, wait_for_return=False):
         """Execute a simple write operation via code execution"""
         code = self.create_write_byte_code(address, value)
-        return await self.execute_snippet(code)
+        return await self.execute_snippet(code[:-1], wait_for_return)  # template RTS would skip the done flag
 
-    async def execute_fill(self, address, value, length):
+    async def execute_fill(self, address, value, length, wait_for_return=False):
         """Execute a memory fill operation via code execution"""
         code = self.create_memory_fill_code(address, value, length)
-        return await self.execute_snippet(code)
+        return await self.execute_snippet(code[:-1], wait_for_return)  # template RTS would skip the done flag
 
-    async def execute_copy(self, src_addr, dst_addr, length):
+    async def execute_copy(self, src_addr, dst_addr, length, wait_for_return=False):
         """Execute a memory copy operation via code execution"""
         code = self.create_memory_copy_code(src_addr, dst_addr, length)
-        return await self.execute_snippet(code)
+        return await self.execute_snippet(code[:-1], wait_for_return)  # template RTS would skip the done flag
+
+    async def execute_batch(self, snippets, wait_for_return=False):
+        """
+        Execute several snippets with a single CMD space upload
+        
+        Args:
+            snippets: List of assembly code bytes, each ending in RTS
+                      (as returned by the create_*_code templates)
+            wait_for_return: Wait for the snippets to finish (see execute_snippet())
+        
+        Returns:
+            Success status (bool)
+        """
+        for code in snippets:
+            if not code or code[-1] != 0x60:
+                raise ValueError('Batched snippets must end in RTS')
+        
+        # Drop each RTS so the snippets run back to back
+        body = b''.join(code[:-1] for code in snippets)
+        return await self.execute_snippet(body, wait_for_return)
+
+    async def batch_writes(self, writes, wait_for_return=False):
+        """
+        Execute many byte writes in one round trip
+        
+        Args:
+            writes: List of (address, value) pairs
+            wait_for_return: Wait for the writes to finish (see execute_snippet())
+        
+        Returns:
+            Success status (bool)
+        """
+        return await self.execute_batch([self.create_write_byte_code(address, value)
+                                         for address, value in writes], wait_for_return)
 
     # ========================================
     # Assembly Utilities
@@ -297,39 +471,30 @@ class CodeExecutor:
         Returns:
             Machine code bytes
         """
-        import re
         cleaned = instruction.strip().upper()
         
+        # RTS / RTL / NOP
+        code = _IMPLIED.get(cleaned)
+        if code is not None:
+            return code
+        
         # LDA #$xx
-        match = re.match(r'^LDA #\$([0-9A-F]{2})$', cleaned)
+        match = _LDA_IMM.match(cleaned)
         if match:
             value = int(match.group(1), 16)
             return bytes([0xA9, value])
         
         # STA $xxxx
-        match = re.match(r'^STA \$([0-9A-F]{4})$', cleaned)
+        match = _STA_ABS.match(cleaned)
         if match:
             addr = int(match.group(1), 16)
             return bytes([0x8D, addr & 0xFF, (addr >> 8) & 0xFF])
         
-        # RTS
-        if cleaned == 'RTS':
-            return bytes([0x60])
-        
-        # RTL
-        if cleaned == 'RTL':
-            return bytes([0x6B])
-        
-        # NOP
-        if cleaned == 'NOP':
-            return bytes([0xEA])
-        
         raise ValueError(f'Unsupported instruction: {instruction}')
 
     def assemble_instructions(self, instructions):
         """Assemble multiple instructions"""
-        buffers = [self.assemble_instruction(inst) for inst in instructions]
-        return b''.join(buffers)
+        return b''.join(map(self.assemble_instruction, instructions))
 
     def disassemble(self, code):
         """
@@ -343,41 +508,28 @@ class CodeExecutor:
         """
         result = []
         i = 0
+        size = len(code)
         
-        while i < len(code):
+        while i < size:
             opcode = code[i]
+            entry = _OPCODES[opcode]
             
-            if opcode == 0xA9:  # LDA #$xx
-                if i + 1 < len(code):
-                    result.append(f'LDA #${code[i + 1]:02X}')
-                    i += 2
-                else:
-                    result.append('??? (incomplete LDA)')
-                    i += 1
-                    
-            elif opcode == 0x8D:  # STA $xxxx
-                if i + 2 < len(code):
-                    addr = code[i + 1] | (code[i + 2] << 8)
-                    result.append(f'STA ${addr:04X}')
-                    i += 3
-                else:
-                    result.append('??? (incomplete STA)')
-                    i += 1
-                    
-            elif opcode == 0x60:  # RTS
-                result.append('RTS')
-                i += 1
-                
-            elif opcode == 0x6B:  # RTL
-                result.append('RTL')
+            if entry is None:
+                result.append(f'??? (${opcode:02X})')
                 i += 1
-                
-            elif opcode == 0xEA:  # NOP
-                result.append('NOP')
+                continue
+            
+            name, operand_size, fmt = entry
+            
+            if not operand_size:
+                result.append(fmt)
                 i += 1
-                
+            elif i + operand_size < size:
+                operand = int.from_bytes(code[i + 1:i + 1 + operand_size], 'little')
+                result.append(fmt.format(operand))
+                i += 1 + operand_size
             else:
-                result.append(f'??? (${opcode:02X})')
+                result.append(f'??? (incomplete {name})')
                 i += 1
         
         return result
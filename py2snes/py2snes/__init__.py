@@ -6,10 +6,31 @@ from pathlib import Path
 
 import asyncio
 import aiofiles
+import functools
 import os
+import re
+import struct
+import time
 
 import logging
 
+# Use orjson to serialize requests when it is installed
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+    def _dumps(request):
+        # Requests must go out as text frames; binary frames are data
+        return orjson.dumps(request).decode()
+else:
+    _dumps = json.dumps
+
+# asyncio.timeout() (Python 3.11+) bounds a block without wrapping it in a task
+ASYNCIO_TIMEOUT_AVAILABLE = hasattr(asyncio, 'timeout')
+
 class usb2snesException(Exception):
     pass
 
@@ -23,22 +44,48 @@ WRAM_START = 0xF50000
 WRAM_SIZE = 0x20000
 SRAM_START = 0xE00000
 
+# SD2SNES CMD-space write routine: the prologue saves state and switches
+# to 8-bit A, then one LDA #byte / STA.l ptr (A9 bb 8F ll mm hh) per byte,
+# then the epilogue clears the $2C00 trigger, restores and returns
+_SD2SNES_PROLOGUE = b'\x00\xE2\x20\x48\xEB\x48'
+_SD2SNES_EPILOGUE = b'\xA9\x00\x8F\x00\x2C\x00\x68\xEB\x68\x28\x6C\xEA\xFF\x08'
+_PACK_LDA_STA_LONG = struct.Struct('<BBBHB').pack_into
+
 # ========================================
 # CONFIGURATION CONSTANTS
 # ========================================
 
 # PutFile chunk size (bytes)
-# Recommended: 1024 bytes for better flow control
-# May use 4096 for faster transfers on stable connections
-DEFAULT_CHUNK_SIZE = 1024
+# Every chunk is one websocket frame, so large chunks keep framing overhead
+# low; drop to 1024 for stricter flow control on unreliable connections
+DEFAULT_CHUNK_SIZE = 65536
 CHUNK_SIZE = int(os.environ.get('USB2SNES_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
 
+# PutFile send window (chunks handed to the socket before waiting for the
+# oldest one to be flushed)
+DEFAULT_SEND_WINDOW = 4
+SEND_WINDOW = max(1, int(os.environ.get('USB2SNES_SEND_WINDOW', DEFAULT_SEND_WINDOW)))
+
 # Directory pre-creation
 PREEMPTIVE_DIR_CREATE = os.environ.get('USB2SNES_PREEMPTIVE_DIR', 'true').lower() != 'false'
 
 # Upload verification
 VERIFY_AFTER_UPLOAD = os.environ.get('USB2SNES_VERIFY_UPLOAD', 'true').lower() != 'false'
 
+# Websocket permessage-deflate ('deflate' to enable). Off by default: ROM
+# and memory payloads barely compress, so it only costs a zlib pass over
+# every frame on both ends
+WS_COMPRESSION = os.environ.get('USB2SNES_WS_COMPRESSION', 'none').strip().lower()
+if WS_COMPRESSION in ('', 'none', 'false'):
+    WS_COMPRESSION = None
+elif WS_COMPRESSION != 'deflate':
+    logging.warning(f"[py2snes] Ignoring USB2SNES_WS_COMPRESSION={WS_COMPRESSION!r} (expected 'deflate' or 'none')")
+    WS_COMPRESSION = None
+
+# Largest websocket message accepted (bytes, 0 for no limit)
+DEFAULT_WS_MAX_SIZE = 4 * 1024 * 1024
+WS_MAX_SIZE = int(os.environ.get('USB2SNES_WS_MAX_SIZE', DEFAULT_WS_MAX_SIZE)) or None
+
 # Blocking upload timeout (seconds per MB)
 BLOCKING_TIMEOUT_PER_MB = int(os.environ.get('USB2SNES_TIMEOUT_PER_MB', '10'))
 
@@ -48,19 +95,45 @@ SAVESTATE_DATA_ADDRESS = 0xF00000
 SAVESTATE_INTERFACE_ADDRESS_OLD = 0xFC2000  # Firmware < 11
 SAVESTATE_INTERFACE_ADDRESS_NEW = 0xFE1000  # Firmware >= 11
 
+# Requests without operands, serialized once
+_DEVICE_LIST_REQUEST = _dumps({"Opcode" : "DeviceList", "Space" : "SNES"})
+_MENU_REQUEST = _dumps({"Opcode" : "Menu", "Space" : "SNES"})
+_RESET_REQUEST = _dumps({"Opcode" : "Reset", "Space" : "SNES"})
+
+def _requires_attached(method):
+    """Make a snes method return None unless attached to a device"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if not self._attached():
+            return None
+        return await method(self, *args, **kwargs)
+    return wrapper
+
+def _retrieve_exception(task):
+    """
+    Done callback that marks a task's exception as retrieved, so asyncio
+    does not log "Task exception was never retrieved" when nobody awaits it
+    """
+    if not task.cancelled():
+        task.exception()
+
 class snes():
     def __init__(self):
         self.state = SNES_DISCONNECTED
         self.socket = None
         self.recv_queue = asyncio.Queue()
         self.request_lock = asyncio.Lock()
+        self._last_reply = None  # reply read of the latest request (see _read_reply)
         self.is_sd2snes = False
         # self.attached = False
         
         # Configuration (can be overridden per instance)
         self.chunk_size = CHUNK_SIZE
+        self.send_window = SEND_WINDOW
         self.preemptive_dir_create = PREEMPTIVE_DIR_CREATE
         self.verify_after_upload = VERIFY_AFTER_UPLOAD
+        self.ws_compression = WS_COMPRESSION
+        self.ws_max_size = WS_MAX_SIZE
         
         # Savestate configuration
         self.savestate_interface_address = SAVESTATE_INTERFACE_ADDRESS_OLD
@@ -69,8 +142,16 @@ class snes():
         
         logging.info(f'[py2snes] Configuration:')
         logging.info(f'  Chunk size: {self.chunk_size} bytes')
+        logging.info(f'  Send window: {self.send_window} chunks')
         logging.info(f'  Preemptive dir create: {self.preemptive_dir_create}')
         logging.info(f'  Verify after upload: {self.verify_after_upload}')
+        logging.info(f'  Websocket compression: {self.ws_compression}')
+        logging.info(f'  Websocket max message size: {self.ws_max_size}')
+
+    def _attached(self):
+        """True when attached to a device over an open socket"""
+        socket = self.socket
+        return self.state == SNES_ATTACHED and socket is not None and socket.open and not socket.closed
 
     async def connect(self, address='ws://localhost:8080'):
         if self.socket is not None:
@@ -83,7 +164,14 @@ class snes():
         print("Connecting to QUsb2snes at %s ..." % address)
 
         try:
-            self.socket = await websockets.connect(address, ping_timeout=None, ping_interval=None)
+            self.socket = await websockets.connect(
+                address,
+                ping_timeout=None,
+                ping_interval=None,
+                compression=self.ws_compression,
+                max_size=self.ws_max_size,
+                write_limit=2 ** 20,
+            )
             self.state = SNES_CONNECTED
         except Exception as e:
             if self.socket is not None:
@@ -95,18 +183,14 @@ class snes():
         self.recv_task = asyncio.create_task(self.recv_loop())
 
     async def DeviceList(self):
-        await self.request_lock.acquire()
-
-        if self.state < SNES_CONNECTED or self.socket is None or not self.socket.open or self.socket.closed:
-            return None
         try:
-            request = {
-                "Opcode" : "DeviceList",
-                "Space" : "SNES",
-            }
-            await self.socket.send(json.dumps(request))
+            async with self.request_lock:
+                if self.state < SNES_CONNECTED or self.socket is None or not self.socket.open or self.socket.closed:
+                    return None
+                await self.socket.send(_DEVICE_LIST_REQUEST)
+                reply = self._read_reply(self._recv_message)
 
-            reply = json.loads(await asyncio.wait_for(self.recv_queue.get(), 5))
+            reply = json.loads(await reply)
             devices = reply['Results'] if 'Results' in reply and len(reply['Results']) > 0 else None
 
             if not devices:
@@ -119,8 +203,6 @@ class snes():
                     await self.socket.close()
                 self.socket = None
             self.state = SNES_DISCONNECTED
-        finally:
-            self.request_lock.release()
 
     async def Attach(self, device):
         if self.state != SNES_CONNECTED or self.socket is None or not self.socket.open or self.socket.closed:
@@ -131,7 +213,7 @@ class snes():
                 "Space" : "SNES",
                 "Operands" : [device]
             }
-            await self.socket.send(json.dumps(request))
+            await self.socket.send(_dumps(request))
             self.state = SNES_ATTACHED
 
             if 'SD2SNES'.lower() in device.lower() or (len(device) == 4 and device[:3] == 'COM'):
@@ -150,45 +232,42 @@ class snes():
 
     async def Info(self):
         try:
-            await self.request_lock.acquire()
-
-            if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-                return None
-            try:
+            async with self.request_lock:
+                if not self._attached():
+                    return None
                 request = {
                     "Opcode" : "Info",
                     "Space" : "SNES",
                     "Operands" : [self.device]
                 }
-                await self.socket.send(json.dumps(request))
-                reply = json.loads(await asyncio.wait_for(self.recv_queue.get(), 5))
-                info = reply['Results'] if 'Results' in reply and len(reply['Results']) > 0 else None
-                return {
-                    "firmwareversion": _listitem(info,0),
-                    "versionstring": _listitem(info,1),
-                    "romrunning": _listitem(info,2),
-                    "flag1": _listitem(info,3),
-                    "flag2": _listitem(info,4),
-                }
-            except Exception as e:
-                if self.socket is not None:
-                    if not self.socket.closed:
-                        await self.socket.close()
-                    self.socket = None
-                self.snes_state = SNES_DISCONNECTED
-        finally:
-            self.request_lock.release()
+                await self.socket.send(_dumps(request))
+                reply = self._read_reply(self._recv_message)
+
+            reply = json.loads(await reply)
+            info = reply['Results'] if 'Results' in reply and len(reply['Results']) > 0 else None
+            return {
+                "firmwareversion": _listitem(info,0),
+                "versionstring": _listitem(info,1),
+                "romrunning": _listitem(info,2),
+                "flag1": _listitem(info,3),
+                "flag2": _listitem(info,4),
+            }
+        except Exception as e:
+            if self.socket is not None:
+                if not self.socket.closed:
+                    await self.socket.close()
+                self.socket = None
+            self.snes_state = SNES_DISCONNECTED
 
+    @_requires_attached
     async def Name(self, name):
-        if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-            return None
         try:
             request = {
                 "Opcode" : "Name",
                 "Space" : "SNES",
                 "Operands" : [name]
             }
-            await self.socket.send(json.dumps(request))
+            await self.socket.send(_dumps(request))
         except Exception as e:
             if self.socket is not None:
                 if not self.socket.closed:
@@ -196,16 +275,15 @@ class snes():
                 self.socket = None
             self.state = SNES_DISCONNECTED
 
+    @_requires_attached
     async def Boot(self, rom):
-        if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-            return None
         try:
             request = {
                 "Opcode" : "Boot",
                 "Space" : "SNES",
                 "Operands" : [rom]
             }
-            await self.socket.send(json.dumps(request))
+            await self.socket.send(_dumps(request))
         except Exception as e:
             if self.socket is not None:
                 if not self.socket.closed:
@@ -213,16 +291,11 @@ class snes():
                 self.socket = None
             self.state = SNES_DISCONNECTED
 
+    @_requires_attached
     async def Menu(self):
-        if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-            return None
         try:
-            request = {
-                "Opcode" : "Menu",
-                "Space" : "SNES",
-            }
-            print(json.dumps(request))
-            await self.socket.send(json.dumps(request))
+            print(_MENU_REQUEST)
+            await self.socket.send(_MENU_REQUEST)
         except Exception as e:
             if self.socket is not None:
                 if not self.socket.closed:
@@ -230,15 +303,10 @@ class snes():
                 self.socket = None
             self.state = SNES_DISCONNECTED
 
+    @_requires_attached
     async def Reset(self):
-        if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-            return None
         try:
-            request = {
-                "Opcode" : "Reset",
-                "Space" : "SNES",
-            }
-            await self.socket.send(json.dumps(request))
+            await self.socket.send(_RESET_REQUEST)
         except Exception as e:
             if self.socket is not None:
                 if not self.socket.closed:
@@ -247,10 +315,33 @@ class snes():
             self.state = SNES_DISCONNECTED
 
     async def GetAddress(self, address, size):
-        try:
-            await self.request_lock.acquire()
+        data = bytearray(size)
+        if not await self.GetAddressInto(data, address, size):
+            return None
+
+        return bytes(data)
+
+    async def GetAddressInto(self, buffer, address, size, offset=0):
+        """
+        Read memory straight into a caller-provided buffer
+        Callers reading the same block over and over (savestates, snapshots)
+        can keep one buffer instead of getting a new bytes object every time
+        
+        Args:
+            buffer: Writable bytes-like object, e.g. a bytearray
+            address: Address to read
+            size: Number of bytes to read
+            offset: Byte offset in buffer to read into
+        
+        Returns:
+            True once all size bytes are in buffer, None on failure
+        """
+        capacity = memoryview(buffer).nbytes
+        if offset < 0 or offset + size > capacity:
+            raise ValueError(f'{size} bytes at offset {offset} do not fit in a {capacity} byte buffer')
 
-            if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
+        async with self.request_lock:
+            if not self._attached():
                 return None
 
             GetAddress_Request = {
@@ -259,28 +350,22 @@ class snes():
                 "Operands" : [hex(address)[2:], hex(size)[2:]]
             }
             try:
-                await self.socket.send(json.dumps(GetAddress_Request))
+                await self.socket.send(_dumps(GetAddress_Request))
             except websockets.ConnectionClosed:
                 return None
+            reply = self._read_reply(self._recv_into, buffer, offset, size)
 
-            data = bytes()
-            while len(data) < size:
-                try:
-                    data += await asyncio.wait_for(self.recv_queue.get(), 5)
-                except asyncio.TimeoutError:
-                    break
+        received = await reply
 
-            if len(data) != size:
-                print('Error reading %s, requested %d bytes, received %d' % (hex(address), size, len(data)))
-                if len(data):
-                    print(str(data))
-                if self.socket is not None and not self.socket.closed:
-                    await self.socket.close()
-                return None
+        if received != size:
+            print('Error reading %s, requested %d bytes, received %d' % (hex(address), size, received))
+            if received:
+                print(str(bytes(memoryview(buffer).cast('B')[offset:offset + min(received, size)])))
+            if self.socket is not None and not self.socket.closed:
+                await self.socket.close()
+            return None
 
-            return data
-        finally:
-            self.request_lock.release()
+        return True
 
     async def GetAddresses(self, address_list):
         """
@@ -294,66 +379,148 @@ class snes():
         Returns:
             List of bytes objects (one per address, in order)
         """
-        try:
-            await self.request_lock.acquire()
+        return await self._read_batch(self._prepare_batch(address_list))
 
-            if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-                return None
+    def _prepare_batch(self, address_list):
+        """
+        Serialize a batch GetAddress request
+        
+        Callers that poll the same addresses keep the result and hand it to
+        _read_batch on every poll, so the request is only built once
+        
+        Args:
+            address_list: List of (address, size) tuples
+        
+        Returns:
+            Tuple of (serialized request, sizes, total size)
+        """
+        # Build operands: addr1, size1, addr2, size2, ...
+        operands = []
+        sizes = []
+        
+        for address, size in address_list:
+            operands.append(hex(address)[2:])
+            operands.append(hex(size)[2:])
+            sizes.append(size)
+
+        request = {
+            "Opcode" : "GetAddress",
+            "Space" : "SNES",
+            "Operands" : operands
+        }
+        
+        return _dumps(request), tuple(sizes), sum(sizes)
 
-            # Build operands: addr1, size1, addr2, size2, ...
-            operands = []
-            total_size = 0
-            
-            for address, size in address_list:
-                operands.append(hex(address)[2:])
-                operands.append(hex(size)[2:])
-                total_size += size
+    async def _read_batch(self, batch):
+        """Send a request from _prepare_batch and split the reply"""
+        request, sizes, total_size = batch
+        data = bytearray(total_size)
+        
+        async with self.request_lock:
+            if not self._attached():
+                return None
 
-            request = {
-                "Opcode" : "GetAddress",
-                "Space" : "SNES",
-                "Operands" : operands
-            }
-            
-            logging.info(f'[py2snes] Batch read: {len(address_list)} addresses ({total_size} bytes total)')
+            logging.info(f'[py2snes] Batch read: {len(sizes)} addresses ({total_size} bytes total)')
             
             try:
-                await self.socket.send(json.dumps(request))
+                await self.socket.send(request)
             except websockets.ConnectionClosed:
                 return None
-
             # Read all binary data
-            data = bytes()
-            while len(data) < total_size:
-                try:
-                    data += await asyncio.wait_for(self.recv_queue.get(), 5)
-                except asyncio.TimeoutError:
-                    break
+            reply = self._read_reply(self._recv_into, data, 0, total_size)
 
-            if len(data) != total_size:
-                logging.error(f'[py2snes] Batch read error: requested {total_size} bytes, received {len(data)}')
-                if self.socket is not None and not self.socket.closed:
-                    await self.socket.close()
-                return None
+        received = await reply
 
-            # Split data into individual results according to requested sizes
-            results = []
-            consumed = 0
-            
-            for address, size in address_list:
-                results.append(data[consumed:consumed + size])
-                consumed += size
+        if received != total_size:
+            logging.error(f'[py2snes] Batch read error: requested {total_size} bytes, received {received}')
+            if self.socket is not None and not self.socket.closed:
+                await self.socket.close()
+            return None
 
-            logging.info(f'[py2snes] Batch read complete: {len(results)} addresses retrieved')
-            return results
-        finally:
-            self.request_lock.release()
+        # Split data into individual results according to requested sizes
+        view = memoryview(data)
+        results = []
+        consumed = 0
+        
+        for size in sizes:
+            results.append(bytes(view[consumed:consumed + size]))
+            consumed += size
+
+        logging.info(f'[py2snes] Batch read complete: {len(results)} addresses retrieved')
+        return results
+
+    def _read_reply(self, reader, *args):
+        """
+        Start reading this request's reply from recv_queue with reader(*args)
+        
+        The device answers requests in the order they were sent, so call this
+        right after sending, while still holding request_lock; the lock can
+        then go to the next request straight away. The read starts once every
+        earlier request has read its reply, and finishes even if the caller
+        is cancelled, so a later request never gets this one's reply
+        
+        Returns:
+            Awaitable for the reader's result
+        """
+        task = asyncio.create_task(self._read_in_turn(self._last_reply, reader, args))
+        # A cancelled caller leaves the read running with nobody to await it
+        task.add_done_callback(_retrieve_exception)
+        self._last_reply = task
+        return asyncio.shield(task)
+
+    async def _read_in_turn(self, previous, reader, args):
+        if previous is not None:
+            await asyncio.wait([previous])
+        return await reader(*args)
+
+    async def _recv_message(self):
+        """Receive one reply message, waiting up to 5 seconds"""
+        return await asyncio.wait_for(self.recv_queue.get(), 5)
+
+    async def _recv_into(self, buffer, offset, size):
+        """
+        Collect binary replies from recv_queue into buffer[offset:offset + size]
+        
+        The whole read shares one deadline (5 seconds plus
+        BLOCKING_TIMEOUT_PER_MB per MB) rather than a timer per chunk
+        
+        Args:
+            buffer: Writable bytes-like object
+            offset: Byte offset in buffer to start at
+            size: Number of bytes expected
+        
+        Returns:
+            Number of bytes received: less than size if the deadline passed
+            first, more if the device sent too much (the excess is dropped)
+        """
+        target = memoryview(buffer).cast('B')[offset:offset + size]
+        received = 0
+
+        async def collect():
+            nonlocal received
+            while received < size:
+                chunk = await self.recv_queue.get()
+                end = min(received + len(chunk), size)
+                target[received:end] = chunk[:end - received]
+                received += len(chunk)
+
+        timeout = 5 + size / (1024 * 1024) * BLOCKING_TIMEOUT_PER_MB
+        try:
+            if ASYNCIO_TIMEOUT_AVAILABLE:
+                async with asyncio.timeout(timeout):
+                    await collect()
+            else:
+                await asyncio.wait_for(collect(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        return received
 
     async def PutAddress(self, write_list):
         try:
             await self.request_lock.acquire()
 
-            if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
+            if not self._attached():
                 return False
 
             PutAddress_Request = {
@@ -362,39 +529,44 @@ class snes():
             }
 
             if self.is_sd2snes:
-                cmd = b'\x00\xE2\x20\x48\xEB\x48'
-
+                # Check every write before sizing the command buffer
+                total_len = 0
                 for address, data in write_list:
                     if (address < WRAM_START) or ((address + len(data)) > (WRAM_START + WRAM_SIZE)):
-                        print("SD2SNES: Write out of range %s (%d)" % (hex(address), len(data)))
+                        logging.error(f'[py2snes] SD2SNES: Write out of range {hex(address)} ({len(data)})')
                         return False
-                    for ptr, byte in enumerate(data, address + 0x7E0000 - WRAM_START):
-                        cmd += b'\xA9' # LDA
-                        cmd += bytes([byte])
-                        cmd += b'\x8F' # STA.l
-                        cmd += bytes([ptr & 0xFF, (ptr >> 8) & 0xFF, (ptr >> 16) & 0xFF])
+                    total_len += len(data)
+
+                # Prologue, 6 bytes (LDA #/STA.l) per byte written, epilogue
+                offset = len(_SD2SNES_PROLOGUE)
+                end = offset + 6 * total_len
+                cmd = bytearray(end + len(_SD2SNES_EPILOGUE))
+                cmd[:offset] = _SD2SNES_PROLOGUE
+                cmd[end:] = _SD2SNES_EPILOGUE
 
-                cmd += b'\xA9\x00\x8F\x00\x2C\x00\x68\xEB\x68\x28\x6C\xEA\xFF\x08'
+                for address, data in write_list:
+                    for ptr, byte in enumerate(data, address + 0x7E0000 - WRAM_START):
+                        _PACK_LDA_STA_LONG(cmd, offset, 0xA9, byte, 0x8F, ptr & 0xFFFF, ptr >> 16)
+                        offset += 6
 
                 PutAddress_Request['Space'] = 'CMD'
                 PutAddress_Request['Operands'] = ["2C00", hex(len(cmd)-1)[2:], "2C00", "1"]
                 try:
                     if self.socket is not None:
-                        await self.socket.send(json.dumps(PutAddress_Request))
-                    if self.socket is not None:
-                        await self.socket.send(cmd)
+                        await self._send_frames([_dumps(PutAddress_Request), cmd])
                 except websockets.ConnectionClosed:
                     return False
             else:
                 PutAddress_Request['Space'] = 'SNES'
+                #will pack those requests as soon as qusb2snes actually supports that for real
+                frames = []
+                for address, data in _coalesce_writes(write_list):
+                    PutAddress_Request['Operands'] = [hex(address)[2:], hex(len(data))[2:]]
+                    frames.append(_dumps(PutAddress_Request))
+                    frames.append(data)
                 try:
-                    #will pack those requests as soon as qusb2snes actually supports that for real
-                    for address, data in write_list:
-                        PutAddress_Request['Operands'] = [hex(address)[2:], hex(len(data))[2:]]
-                        if self.socket is not None:
-                            await self.socket.send(json.dumps(PutAddress_Request))
-                        if self.socket is not None:
-                            await self.socket.send(data)
+                    if self.socket is not None:
+                        await self._send_frames(frames)
                 except websockets.ConnectionClosed:
                     return False
 
@@ -402,6 +574,19 @@ class snes():
         finally:
             self.request_lock.release()
 
+    async def _send_frames(self, frames):
+        """
+        Send several websocket messages back to back
+        
+        All sends are started at once instead of each waiting for the previous
+        one to drain. They still go out in order: each send writes its frame
+        to the transport before its first await
+        """
+        results = await asyncio.gather(*(self.socket.send(frame) for frame in frames), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
     # async def GetFile(self, filepath):
     #     try:
     #         await self.request_lock.acquire()
@@ -467,25 +652,34 @@ class snes():
         Returns:
             True if safe state reached
         """
-        start_time = time.time()
+        deadline = time.monotonic() + timeout_ms / 1000
+        # usb2snes has no change notification, so poll - quickly at first,
+        # backing off for operations that take a while
+        delay = 0.005
         
-        while (time.time() - start_time) < (timeout_ms / 1000):
+        while True:
             flags = await self.GetAddress(self.savestate_interface_address, 2)
             if flags[0] == 0 and flags[1] == 0:
                 return True
-            await asyncio.sleep(0.03)  # Poll every 30ms
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, 0.25)
         
         raise TimeoutError('Timeout waiting for safe state')
 
-    async def SaveStateToMemory(self, trigger=True):
+    async def SaveStateToMemory(self, trigger=True, buffer=None):
         """
         Save state to memory (reads 320KB savestate data)
         
         Args:
             trigger: If True, triggers save via interface; if False, reads existing data
+            buffer: Optional writable 320KB buffer (e.g. a bytearray) to read
+                into, so repeated saves can reuse it
         
         Returns:
-            320KB savestate data (bytes)
+            320KB savestate data (bytes, or buffer itself when given)
         """
         try:
             logging.info('[py2snes] Saving state...')
@@ -503,7 +697,12 @@ class snes():
             
             # Read savestate data (320KB)
             logging.info('[py2snes] Reading savestate data (320KB)...')
-            savestate_data = await self.GetAddress(self.savestate_data_address, SAVESTATE_SIZE)
+            if buffer is None:
+                savestate_data = await self.GetAddress(self.savestate_data_address, SAVESTATE_SIZE)
+            elif await self.GetAddressInto(buffer, self.savestate_data_address, SAVESTATE_SIZE):
+                savestate_data = buffer
+            else:
+                savestate_data = None
             
             if not savestate_data or len(savestate_data) != SAVESTATE_SIZE:
                 raise ValueError(f'Invalid savestate data size: {len(savestate_data) if savestate_data else 0} bytes')
@@ -533,12 +732,14 @@ class snes():
             # Wait for safe state
             await self.WaitForSafeState(5000)
             
-            # Write savestate data to memory (320KB)
+            # Write savestate data to memory (320KB), then trigger load by
+            # writing 1 to loadState flag - one request, so nothing else can
+            # be sent in between
             logging.info('[py2snes] Writing savestate data (320KB)...')
-            await self.PutAddress([[self.savestate_data_address, savestate_data]])
-            
-            # Trigger load by writing 1 to loadState flag
-            await self.PutAddress([[self.savestate_interface_address + 1, bytes([1])]])
+            await self.PutAddress([
+                [self.savestate_data_address, savestate_data],
+                [self.savestate_interface_address + 1, bytes([1])],
+            ])
             
             # Wait for load to complete
             await asyncio.sleep(0.1)
@@ -584,7 +785,9 @@ class snes():
         Args:
             addresses: List of (address, size) tuples
             poll_rate: Poll rate in seconds (default: 0.1 = 100ms = 10Hz)
-            on_change: Callback(changes) when values change
+            on_change: Callback(changes) when values change; each change has
+                       index, address, size, old_value, new_value and
+                       offsets (positions of the bytes that changed)
         
         Returns:
             Watcher object with start(), stop(), get_values(), is_running
@@ -593,6 +796,8 @@ class snes():
             def __init__(watcher_self, snes_instance, addresses, poll_rate, on_change):
                 watcher_self.snes = snes_instance
                 watcher_self.addresses = addresses
+                # The same addresses are read on every poll, so build the request once
+                watcher_self._batch = snes_instance._prepare_batch(addresses)
                 watcher_self.poll_rate = poll_rate
                 watcher_self.on_change = on_change
                 watcher_self.previous_values = None
@@ -608,28 +813,42 @@ class snes():
                 watcher_self.is_running = True
                 
                 # Initial read
-                watcher_self.previous_values = await watcher_self.snes.GetAddresses(watcher_self.addresses)
+                watcher_self.previous_values = await watcher_self.snes._read_batch(watcher_self._batch)
                 
                 # Start polling
                 watcher_self.task = asyncio.create_task(watcher_self._poll_loop())
             
             async def _poll_loop(watcher_self):
+                # Polls are scheduled against fixed deadlines, so the time a
+                # read takes does not stretch the interval between polls
+                loop = asyncio.get_running_loop()
+                next_poll = loop.time()
                 while watcher_self.is_running:
                     try:
-                        await asyncio.sleep(watcher_self.poll_rate)
-                        current_values = await watcher_self.snes.GetAddresses(watcher_self.addresses)
+                        next_poll += watcher_self.poll_rate
+                        now = loop.time()
+                        if now < next_poll:
+                            await asyncio.sleep(next_poll - now)
+                        elif now - next_poll > watcher_self.poll_rate:
+                            # More than a poll behind: drop the missed polls
+                            # rather than reading back to back to catch up
+                            next_poll = now
+                        current_values = await watcher_self.snes._read_batch(watcher_self._batch)
                         
-                        # Detect changes
+                        # Detect changes. Usually nothing changed, which a single
+                        # list compare settles without the per-address loop
                         changes = []
-                        for i in range(len(current_values)):
-                            if watcher_self.previous_values[i] != current_values[i]:
-                                changes.append({
-                                    'index': i,
-                                    'address': watcher_self.addresses[i][0],
-                                    'size': watcher_self.addresses[i][1],
-                                    'old_value': bytes(watcher_self.previous_values[i]),
-                                    'new_value': bytes(current_values[i])
-                                })
+                        if current_values != watcher_self.previous_values:
+                            for i in range(len(current_values)):
+                                if watcher_self.previous_values[i] != current_values[i]:
+                                    changes.append({
+                                        'index': i,
+                                        'address': watcher_self.addresses[i][0],
+                                        'size': watcher_self.addresses[i][1],
+                                        'old_value': bytes(watcher_self.previous_values[i]),
+                                        'new_value': bytes(current_values[i]),
+                                        'offsets': _changed_offsets(watcher_self.previous_values[i], current_values[i])
+                                    })
                         
                         # Call on_change callback if changes detected
                         if changes and watcher_self.on_change:
@@ -710,18 +929,21 @@ class snes():
             Values when all conditions met
         """
         start_time = time.time()
-        addresses = [(c['address'], c['size']) for c in conditions]
+        batch = self._prepare_batch([(c['address'], c['size']) for c in conditions])
         
-        # Build check functions
-        check_funcs = []
-        for c in conditions:
+        # Sort the conditions by kind as (index, value) pairs, so a poll is
+        # plain comparisons plus a call only for the predicate conditions
+        int_checks = []
+        bytes_checks = []
+        callable_checks = []
+        for i, c in enumerate(conditions):
             value = c['value']
             if callable(value):
-                check_funcs.append(value)
+                callable_checks.append((i, value))
             elif isinstance(value, int):
-                check_funcs.append(lambda buf: buf[0] == value)
+                int_checks.append((i, value))
             elif isinstance(value, bytes):
-                check_funcs.append(lambda buf: buf == value)
+                bytes_checks.append((i, value))
             else:
                 raise ValueError('condition.value must be bytes, int, or function')
         
@@ -731,10 +953,12 @@ class snes():
                 raise TimeoutError('Watch timeout - not all conditions met')
             
             # Read all addresses
-            values = await self.GetAddresses(addresses)
+            values = await self._read_batch(batch)
             
             # Check all conditions
-            all_met = all(check_funcs[i](values[i]) for i in range(len(values)))
+            all_met = (all(values[i][0] == value for i, value in int_checks) and
+                       all(values[i] == value for i, value in bytes_checks) and
+                       all(check(values[i]) for i, check in callable_checks))
             
             if all_met:
                 return values
@@ -742,6 +966,7 @@ class snes():
             # Wait before next poll
             await asyncio.sleep(poll_rate)
 
+    @_requires_attached
     async def PutFile(self, srcfile, dstfile, progress_callback=None):
         """
         Upload a file to the console
@@ -752,74 +977,110 @@ class snes():
             dstfile: Destination file path (on console)
             progress_callback: Optional callback function(transferred, total) for progress updates
         """
+        # Preemptive directory creation (if enabled). List and MakeDir take
+        # request_lock themselves, so this runs before the upload takes it
+        if self.preemptive_dir_create:
+            dirpath = dstfile.rsplit('/', 1)[0] if '/' in dstfile else '/'
+            if dirpath != '/':
+                try:
+                    await self.List(dirpath)
+                    logging.info(f'[py2snes] Directory exists: {dirpath}')
+                except Exception as e:
+                    logging.info(f'[py2snes] Creating directory: {dirpath}')
+                    try:
+                        await self.MakeDir(dirpath)
+                        logging.info(f'[py2snes] Directory created: {dirpath}')
+                    except Exception as mkdir_error:
+                        logging.error(f'[py2snes] Failed to create directory: {mkdir_error}')
+                        raise usb2snesException(f'Cannot create directory {dirpath}: {mkdir_error}')
+
+        # The file is streamed: each chunk is read while the ones before
+        # it are still being sent, so disk and network time overlap
+        infile = await aiofiles.open(srcfile, 'rb')
         try:
-            await self.request_lock.acquire()
+            return await self._put_file(infile, dstfile, progress_callback)
+        finally:
+            await infile.close()
 
-            if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
+    async def _put_file(self, infile, dstfile, progress_callback):
+        size = os.fstat(infile.fileno()).st_size
+        transferred = 0
+        
+        # Initial progress callback
+        if progress_callback:
+            progress_callback(0, size)
+        
+        request = {
+            "Opcode" : "PutFile",
+            "Space" : "SNES",
+            "Operands" : [dstfile, hex(size)[2:]]
+        }
+        
+        # Up to send_window chunks are in flight at once instead of
+        # waiting for each send to drain before starting the next
+        window = asyncio.Semaphore(self.send_window)
+        pending = set()
+        errors = []
+        
+        async def send_chunk(socket, chunk):
+            nonlocal transferred
+            try:
+                await socket.send(chunk)
+                transferred += len(chunk)
+                
+                # Progress callback
+                if progress_callback:
+                    progress_callback(transferred, size)
+                
+                # Log progress for large files
+                if size > 1024*1024 and transferred % (512*1024) == 0:
+                    logging.info(f'[py2snes] Upload progress: {round(transferred/size*100)}%')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                window.release()
+        
+        # Never send more than the size announced in the header, even if
+        # the file grows while it is being read
+        remaining = size
+        chunk = await infile.read(min(self.chunk_size, remaining))
+        remaining -= len(chunk)
+        
+        # The lock only has to keep the header and chunks together
+        async with self.request_lock:
+            if not self._attached():
                 return None
+            try:
+                if self.socket is not None:
+                    await self.socket.send(_dumps(request))
+                while chunk:
+                    await window.acquire()
+                    if errors or self.socket is None:
+                        window.release()
+                        break
+                    # Tasks start in creation order, so chunks are written in order
+                    task = asyncio.create_task(send_chunk(self.socket, chunk))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    chunk = await infile.read(min(self.chunk_size, remaining))
+                    remaining -= len(chunk)
+                await asyncio.gather(*pending)
+                if errors:
+                    raise errors[0]
+            except websockets.ConnectionClosed:
+                return False
 
-            # Preemptive directory creation (if enabled)
-            if self.preemptive_dir_create:
-                dirpath = dstfile.rsplit('/', 1)[0] if '/' in dstfile else '/'
-                if dirpath != '/':
-                    try:
-                        await self.List(dirpath)
-                        logging.info(f'[py2snes] Directory exists: {dirpath}')
-                    except Exception as e:
-                        logging.info(f'[py2snes] Creating directory: {dirpath}')
-                        try:
-                            await self.MakeDir(dirpath)
-                            logging.info(f'[py2snes] Directory created: {dirpath}')
-                        except Exception as mkdir_error:
-                            logging.error(f'[py2snes] Failed to create directory: {mkdir_error}')
-                            raise usb2snesException(f'Cannot create directory {dirpath}: {mkdir_error}')
-
-            size = os.path.getsize(srcfile)
-            transferred = 0
-            
-            # Initial progress callback
-            if progress_callback:
-                progress_callback(0, size)
-            
-            async with aiofiles.open(srcfile, 'rb') as infile:
-                request = {
-                    "Opcode" : "PutFile",
-                    "Space" : "SNES",
-                    "Operands" : [dstfile, hex(size)[2:]]
-                }
-                try:
-                    if self.socket is not None:
-                        await self.socket.send(json.dumps(request))
-                    if self.socket is not None:
-                        while True:
-                            chunk = await infile.read(self.chunk_size)
-                            if not chunk: break
-                            await self.socket.send(chunk)
-                            transferred += len(chunk)
-                            
-                            # Progress callback
-                            if progress_callback:
-                                progress_callback(transferred, size)
-                            
-                            # Log progress for large files
-                            if size > 1024*1024 and transferred % (512*1024) == 0:
-                                logging.info(f'[py2snes] Upload progress: {round(transferred/size*100)}%')
-                except websockets.ConnectionClosed:
-                    return False
-
-                # Verify byte count
-                if transferred != size:
-                    raise usb2snesException(f'Transfer incomplete: {transferred}/{size} bytes')
-                
-                logging.info(f'[py2snes] Transferred {transferred} bytes')
+        # Verify byte count
+        if transferred != size:
+            raise usb2snesException(f'Transfer incomplete: {transferred}/{size} bytes')
+        
+        logging.info(f'[py2snes] Transferred {transferred} bytes')
 
-                # Verification after upload (if enabled)
-                if self.verify_after_upload:
-                    await self._verify_upload(dstfile, size)
+        # Verification after upload (if enabled)
+        if self.verify_after_upload:
+            await self._verify_upload(dstfile, size)
 
-                return True
-        finally:
-            self.request_lock.release()
+        return True
 
     async def _verify_upload(self, dstfile, expected_size):
         """
@@ -828,15 +1089,21 @@ class snes():
         dirpath = dstfile.rsplit('/', 1)[0] if '/' in dstfile else '/'
         filename = dstfile.rsplit('/', 1)[1] if '/' in dstfile else dstfile
         
-        # Wait for device to finish writing
-        await asyncio.sleep(1)
-        
-        # Check file exists
+        # Check file exists. The device answers in order, so the listing is
+        # only served once the upload has been taken in; poll for up to a
+        # second in case the file is still being written
         try:
-            files = await self.List(dirpath)
-            # files is list of dicts with 'filename' and 'type'
-            if not any(f['filename'] == filename for f in files):
-                raise usb2snesException(f'File {filename} not found after upload')
+            deadline = time.monotonic() + 1
+            delay = 0.05
+            while True:
+                files = await self.List(dirpath)
+                # files is list of dicts with 'filename' and 'type'
+                if any(f['filename'] == filename for f in files):
+                    break
+                if time.monotonic() >= deadline:
+                    raise usb2snesException(f'File {filename} not found after upload')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.4)
             
             logging.info(f'[py2snes] Upload verified: {dstfile}')
         except Exception as error:
@@ -896,23 +1163,7 @@ class snes():
         Raises:
             usb2snesException: If download fails
         """
-        try:
-            await self.request_lock.acquire()
-
-            if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-                return None
-
-            request = {
-                "Opcode" : "GetFile",
-                "Space" : "SNES",
-                "Operands" : [filepath]
-            }
-            
-            try:
-                await self.socket.send(json.dumps(request))
-            except Exception as e:
-                raise usb2snesException(f'Failed to send GetFile request: {e}')
-
+        async def receive():
             # Get size from reply
             try:
                 reply = json.loads(await asyncio.wait_for(self.recv_queue.get(), 5))
@@ -954,8 +1205,24 @@ class snes():
 
             logging.info(f'[py2snes] Downloaded {len(data)} bytes')
             return data
-        finally:
-            self.request_lock.release()
+
+        async with self.request_lock:
+            if not self._attached():
+                return None
+
+            request = {
+                "Opcode" : "GetFile",
+                "Space" : "SNES",
+                "Operands" : [filepath]
+            }
+            
+            try:
+                await self.socket.send(_dumps(request))
+            except Exception as e:
+                raise usb2snesException(f'Failed to send GetFile request: {e}')
+            reply = self._read_reply(receive)
+
+        return await reply
 
     async def GetFileBlocking(self, filepath, timeout_seconds=None, progress_callback=None):
         """
@@ -1007,10 +1274,9 @@ class snes():
             self.state = SNES_DISCONNECTED
             self.recv_queue = asyncio.Queue()
 
+    @_requires_attached
     async def List(self,dirpath):
-        if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-            return None
-        elif not dirpath.startswith('/') and not dirpath in ['','/']:
+        if not dirpath.startswith('/') and not dirpath in ['','/']:
             raise usb2snesException("Path \"{path}\" should start with \"/\"".format(
                 path=dirpath
             ))
@@ -1040,41 +1306,38 @@ class snes():
 
     async def _list(self, dirpath):
         try:
-            await self.request_lock.acquire()
-
-            if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-                return None
-            try:
+            async with self.request_lock:
+                if not self._attached():
+                    return None
                 request = {
                     'Opcode': 'List',
                     'Space': 'SNES',
                     'Flags': None,
                     'Operands': [dirpath]
                 }
-                await self.socket.send(json.dumps(request))
-                results = json.loads(await asyncio.wait_for(self.recv_queue.get(), 5))['Results']
-
-                resultlist = []
-                for filetype, filename in zip(results[::2], results[1::2]):
-                    resultdict = {
-                        "type": filetype,
-                        "filename": filename
-                    }
-                    if not filename in ['.','..']:
-                        resultlist.append(resultdict)
-                return resultlist
-            except Exception as e:
-                if self.socket is not None:
-                    if not self.socket.closed:
-                        await self.socket.close()
-                    self.socket = None
-                self.snes_state = SNES_DISCONNECTED
-        finally:
-            self.request_lock.release()
+                await self.socket.send(_dumps(request))
+                reply = self._read_reply(self._recv_message)
 
+            results = json.loads(await reply)['Results']
+
+            resultlist = []
+            for filetype, filename in zip(results[::2], results[1::2]):
+                resultdict = {
+                    "type": filetype,
+                    "filename": filename
+                }
+                if not filename in ['.','..']:
+                    resultlist.append(resultdict)
+            return resultlist
+        except Exception as e:
+            if self.socket is not None:
+                if not self.socket.closed:
+                    await self.socket.close()
+                self.socket = None
+            self.snes_state = SNES_DISCONNECTED
+
+    @_requires_attached
     async def MakeDir(self,dirpath):
-        if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-            return None
         if dirpath in ['','/']:
             raise usb2snesException('MakeDir: dirpath cannot be blank or \"/\"')
 
@@ -1086,9 +1349,8 @@ class snes():
         except FileNotFoundError as e:
             await self._mkdir(dirpath)
 
+    @_requires_attached
     async def _mkdir(self, dirpath):
-        if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-            return None
         try:
             request = {
                 'Opcode': 'MakeDir',
@@ -1096,7 +1358,7 @@ class snes():
                 'Flags': None,
                 'Operands': [dirpath]
             }
-            await self.socket.send(json.dumps(request))
+            await self.socket.send(_dumps(request))
         except Exception as e:
             if self.socket is not None:
                 if not self.socket.closed:
@@ -1104,11 +1366,10 @@ class snes():
                 self.socket = None
             self.snes_state = SNES_DISCONNECTED
 
+    @_requires_attached
     async def Remove(self, dirpath):
         """this is pretty broken"""
 
-        if self.state != SNES_ATTACHED or self.socket is None or not self.socket.open or self.socket.closed:
-            return None
         try:
             request = {
                 'Opcode': 'Remove',
@@ -1116,7 +1377,7 @@ class snes():
                 'Flags': None,
                 'Operands': [dirpath]
             }
-            await self.socket.send(json.dumps(request))
+            await self.socket.send(_dumps(request))
         except Exception as e:
             if self.socket is not None:
                 if not self.socket.closed:
@@ -1129,3 +1390,35 @@ def _listitem(list, index):
         return list[index]
     except IndexError:
         return None
+
+def _coalesce_writes(write_list):
+    """
+    Merge each write that starts exactly where the previous one ended
+    
+    Only neighbours in list order are merged, so writes still land in the
+    order given even when they overlap. The callers' buffers are never
+    modified: a run of merged writes is joined into a new bytes object
+    """
+    runs = []
+    for address, data in write_list:
+        if runs and runs[-1][0] + runs[-1][1] == address:
+            runs[-1][1] += len(data)
+            runs[-1][2].append(data)
+        else:
+            runs.append([address, len(data), [data]])
+    return [(address, pieces[0] if len(pieces) == 1 else b''.join(pieces))
+            for address, size, pieces in runs]
+
+# Any byte other than 0x00
+_NONZERO_BYTE = re.compile(rb'[^\x00]')
+
+def _changed_offsets(old, new):
+    """
+    Offsets of the bytes that differ between two buffers
+    
+    The buffers are XORed as integers and the result scanned with a regex,
+    so even spans of thousands of bytes are compared without a Python loop
+    """
+    size = max(len(old), len(new))
+    diff = int.from_bytes(old, 'little') ^ int.from_bytes(new, 'little')
+    return [match.start() for match in _NONZERO_BYTE.finditer(diff.to_bytes(size, 'little'))]
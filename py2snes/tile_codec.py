@@ -0,0 +1,62 @@
+"""
+SNES Tile Encoding
+
+Convert linear 8x8 tiles (one palette index per byte, row by row) into
+the SNES bit-planar 2bpp/4bpp/8bpp formats expected in VRAM
+"""
+
+# Bit 0 of every byte in a 64-bit row
+_LOW_BITS = 0x0101010101010101
+
+# Multiplying the masked row by this gathers the eight bits into the top
+# byte, leftmost pixel in bit 7 - one multiply per plane row instead of
+# eight shift/OR steps
+_GATHER = 0x0102040810204080
+
+def encode_planar(pixels, bpp):
+    """
+    Encode linear tiles to SNES planar format
+
+    Each tile is stored as pairs of bitplanes: for every pair, 8 rows of
+    (low plane byte, high plane byte). 2bpp has one pair, 4bpp two, 8bpp four
+
+    Args:
+        pixels: Bytes-like palette indices, 64 per tile (bits above bpp are ignored)
+        bpp: Bits per pixel (2, 4 or 8)
+
+    Returns:
+        Encoded tile data (bytes, 8 * bpp per tile)
+    """
+    if bpp not in (2, 4, 8):
+        raise ValueError(f'Unsupported bit depth: {bpp}')
+
+    if len(pixels) % 64:
+        raise ValueError(f'Pixel data is not a whole number of 8x8 tiles ({len(pixels)} bytes)')
+
+    # Each 8-pixel row as one integer, leftmost pixel in the top byte
+    rows = [int.from_bytes(pixels[i:i + 8], 'big') for i in range(0, len(pixels), 8)]
+
+    out = bytearray(len(rows) * bpp)
+    pos = 0
+
+    for tile_start in range(0, len(rows), 8):
+        tile = rows[tile_start:tile_start + 8]
+        for plane in range(0, bpp, 2):
+            for row in tile:
+                out[pos] = ((((row >> plane) & _LOW_BITS) * _GATHER) >> 56) & 0xFF
+                out[pos + 1] = ((((row >> (plane + 1)) & _LOW_BITS) * _GATHER) >> 56) & 0xFF
+                pos += 2
+
+    return bytes(out)
+
+def linear_to_2bpp(pixels):
+    """Encode linear tiles to SNES 2bpp (16 bytes per tile)"""
+    return encode_planar(pixels, 2)
+
+def linear_to_4bpp(pixels):
+    """Encode linear tiles to SNES 4bpp (32 bytes per tile)"""
+    return encode_planar(pixels, 4)
+
+def linear_to_8bpp(pixels):
+    """Encode linear tiles to SNES 8bpp (64 bytes per tile)"""
+    return encode_planar(pixels, 8)
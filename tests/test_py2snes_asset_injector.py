@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test cases for py2snes/asset_injector.py
+
+Checks that the module imports both ways it is used: as part of the
+py2snes package from the repository root (as in
+devdocs/ASSET_INJECTION_GUIDE.md) and as a plain module with py2snes/ on
+sys.path.
+
+Usage:
+    python tests/test_py2snes_asset_injector.py
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).parent.parent
+
+
+def _import_in_subprocess(statement, path):
+    """Run an import in a fresh interpreter with only path added to sys.path"""
+    env = dict(os.environ, PYTHONPATH=str(path))
+    return subprocess.run([sys.executable, '-c', statement], cwd=str(path),
+                          env=env, capture_output=True, text=True)
+
+
+def test_import_through_package():
+    """Test Case 1: from py2snes.asset_injector import SNESAssetInjector"""
+    result = _import_in_subprocess('from py2snes.asset_injector import SNESAssetInjector', REPO_ROOT)
+    assert result.returncode == 0, result.stderr
+
+
+def test_import_as_plain_module():
+    """Test Case 2: import asset_injector with py2snes/ on sys.path"""
+    result = _import_in_subprocess('from asset_injector import SNESAssetInjector', REPO_ROOT / 'py2snes')
+    assert result.returncode == 0, result.stderr
+
+
+def run_all_tests():
+    failed = 0
+    for test in (test_import_through_package, test_import_as_plain_module):
+        try:
+            test()
+            print(f"  ✓ {test.__doc__}")
+        except AssertionError as e:
+            print(f"  ✗ {test.__doc__}\n{e}")
+            failed += 1
+    return failed == 0
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run_all_tests() else 1)
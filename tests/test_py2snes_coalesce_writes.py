@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test cases for py2snes PutAddress write coalescing (_coalesce_writes)
+
+Usage:
+    python tests/test_py2snes_coalesce_writes.py
+"""
+
+import sys
+from pathlib import Path
+
+# The py2snes client package lives in py2snes/py2snes
+sys.path.insert(0, str(Path(__file__).parent.parent / 'py2snes'))
+
+from py2snes import _coalesce_writes
+
+
+def test_adjacent_writes_merge():
+    """Test Case 1: writes continuing where the last one ended are merged"""
+    merged = _coalesce_writes([(0xF50000, b'ab'), (0xF50002, b'cd'), (0xF50010, b'e')])
+    assert merged == [(0xF50000, b'abcd'), (0xF50010, b'e')], merged
+
+
+def test_order_kept_for_overlaps():
+    """Test Case 2: only list neighbours merge, so overlapping writes keep their order"""
+    merged = _coalesce_writes([(0xF50002, b'cd'), (0xF50000, b'ab'), (0xF50002, b'xy')])
+    assert merged == [(0xF50002, b'cd'), (0xF50000, b'abxy')], merged
+
+
+def test_inputs_left_unchanged():
+    """Test Case 3: the callers' buffers are not modified"""
+    first = bytearray(b'ab')
+    second = bytearray(b'cd')
+    third = memoryview(bytearray(b'ef'))
+    merged = _coalesce_writes([(0xF50000, first), (0xF50002, second), (0xF50004, third)])
+    assert merged == [(0xF50000, b'abcdef')], merged
+    assert first == b'ab' and second == b'cd' and third == b'ef'
+
+
+def run_all_tests():
+    failed = 0
+    for test in (test_adjacent_writes_merge, test_order_kept_for_overlaps, test_inputs_left_unchanged):
+        try:
+            test()
+            print(f"  ✓ {test.__doc__}")
+        except AssertionError as e:
+            print(f"  ✗ {test.__doc__}: {e}")
+            failed += 1
+    return failed == 0
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run_all_tests() else 1)